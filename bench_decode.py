@@ -0,0 +1,69 @@
+# bench_decode.py
+# Pneumatic Tube System packet decoder benchmark
+# Compares the struct based decoders in pts_decode.py against the
+# ord()/StrToLong parse functions of pts_listener_v1.48.py
+# By MS Technology Solutions LLC
+# For Colombo Pneumatic Tube Systems Inc
+#
+# History:
+# v1.00     17-Oct-2026  Initial Release
+version = 'bench_decode.py version 1.00 17-Oct-26'
+#
+import imp
+import os
+import struct
+import sys
+import timeit
+import pts_decode
+
+# number of decodes per measurement
+loops = 100000
+
+def samplePackets():
+    """
+    Build one representative packet for each decoded command byte
+    """
+    names = ''.join([('STATION %d' % i).ljust(12, '\0') for i in range(10)])
+    parblock = struct.pack('<BBcBLB17x', 4, 4, 'S', 0, 123456, 4) + names + \
+               '\0' * 133 + struct.pack('<BLL', 154, 1000, 999999999)
+    return [
+        ('X', struct.pack('<BBcBLLLHBBBB', 4, 4, 'X', 0, 123456, 9876, 1100000000, 35, 1, 7, 0, 2)),
+        ('V', struct.pack('<BBcBLLLHBBBB', 4, 4, 'V', 0, 123456, 9877, 1100000000, 0, 3, 0, 64, 1)),
+        ('W', struct.pack('<BBcBLLL7B', 4, 4, 'W', 3, 123456, 9876, 1100000040, 0, 154, 1, 2, 0, 3, 0)),
+        ('w', struct.pack('<BBcBLLL7B', 4, 1, 'w', 3, 123456, 0, 1100000050, 1, 2, 3, 4, 0, 0, 0x23)),
+        ('S', parblock),
+    ]
+
+def main():
+
+    print version
+    # reference implementation, needs the same environment as the listener
+    legacy = imp.load_source('pts_listener_v148', 'pts_listener_v1.48.py')
+    oldParse = {
+        'X': legacy.parseTransaction,
+        'V': legacy.parseTransaction,
+        'W': legacy.parseSecureRemoval,
+        'w': legacy.parseSecureRemoval,
+        'S': legacy.parseParBlock,
+    }
+
+    for cmd, pkt in samplePackets():
+        # parseSecureRemoval prints the card ID, keep it out of the timing output
+        stdout = sys.stdout
+        sys.stdout = open(os.devnull, 'w')
+        try:
+            old = oldParse[cmd](pkt)
+            tOld = timeit.timeit(lambda: oldParse[cmd](pkt), number=loops)
+        finally:
+            sys.stdout.close()
+            sys.stdout = stdout
+        new = pts_decode.decodePacket(pkt)
+        tNew = timeit.timeit(lambda: pts_decode.decodePacket(pkt), number=loops)
+
+        if (old != new):
+            print "Mismatch for", cmd, old, new
+        print "%s  parse %6.2f us  decode %6.2f us  speedup %4.1fx" % \
+              (cmd, tOld * 1e6 / loops, tNew * 1e6 / loops, tOld / tNew)
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,202 @@
+# bench_hotpath.py
+# Pneumatic Tube System per packet hot path benchmark
+# Times decode, enrich and format steps of pts_listener_v1.49.py on packet
+# fixtures and compares them against a stored baseline
+# By MS Technology Solutions LLC
+# For Colombo Pneumatic Tube Systems Inc
+#
+# Packets come from bench_fixtures.txt (name and hex per line) or, with -j,
+# from a recorded raw packet journal (pts_journal_YYYY-MM-DD.bin), the first
+# packet of each command byte and card ID path found in it.  Each case is
+# timed as the best of several repeats of a fixed number of calls, so a
+# busy machine makes a run slower but rarely faster.
+#
+# bench_baseline.json keeps the microseconds per call of every case.  -s
+# stores the current run as the baseline; otherwise a case more than
+# tolerance slower than its baseline is reported and the exit code is 1,
+# so the run can gate a release.
+#
+# History:
+# v1.00     17-Oct-2026  Initial Release
+# v1.01     17-Oct-2026  Time the DATETIME text conversion of pts_clock
+version = 'bench_hotpath.py version 1.01 17-Oct-26'
+#
+# settings
+listenerFile = 'pts_listener_v1.49.py'
+fixtureFile = 'bench_fixtures.txt'
+baselineFile = 'bench_baseline.json'
+loops = 20000 # calls per repeat
+repeats = 5 # repeats per case, the fastest counts
+tolerance = 0.20 # fraction slower than the baseline that counts as a regression
+#
+import binascii
+import getopt
+import imp
+import json
+import platform
+import sys
+import timeit
+import pts_decode
+from pts_journal import readFrames
+from pts_stations import StationNames
+
+class NullBatch(object):
+    """
+    EventBatch stand-in that keeps the last row, to time the row building only
+    """
+    def add(self, sql, params):
+        self.last = (sql, params)
+
+    def flush(self, atomic=False):
+        pass
+
+def loadFixtures( filename ):
+    """
+    Read (name, packet) pairs from a fixture file
+    """
+    fixtures = []
+    f = open(filename)
+    try:
+        for line in f:
+            line = line.strip()
+            if (len(line) == 0 or line.startswith('#')):
+                continue
+            name, data = line.split()
+            fixtures.append((name, binascii.unhexlify(data)))
+    finally:
+        f.close()
+    return fixtures
+
+def journalFixtures( filename ):
+    """
+    First packet of every command byte and secure card path in a journal
+    """
+    detector = pts_decode.LayoutDetector()
+    fixtures = []
+    seen = set()
+    for offset, recvTime, addr, packet in readFrames(filename):
+        layout, command = detector.detect(packet, addr[0])
+        if (layout != pts_decode.V144):
+            continue
+        name = command
+        if (command in ('W', 'w')):
+            name += '-device4' if (pts_decode.PEEK.unpack_from(packet)[0] == 4) else '-legacy'
+        if (name not in seen):
+            seen.add(name)
+            fixtures.append((name, packet))
+    return fixtures
+
+def buildCases( listener, fixtures ):
+    """
+    (case name, function) for every timed step
+    """
+    stations = StationNames()
+    cases = []
+    for name, packet in fixtures:
+        command = packet[2]
+        decoder = pts_decode.V144.decoders.get(command)
+        if (decoder == None):
+            continue
+        cases.append(('decode ' + name, lambda d=decoder, p=packet: d(p)))
+        dataAry = decoder(packet)
+        if (command == 'S'):
+            stations.update(dataAry)
+        elif (command == 'X'):
+            cases.append(('stations ' + name, lambda a=dataAry: listener.getTransStationNames(list(a), stations, None)))
+        elif (command == 'V'):
+            cases.append(('stations ' + name, lambda a=dataAry: listener.getEventStationNames(list(a), stations, None)))
+        if (command in ('X', 'V')):
+            row = list(dataAry) + ['STATION 1', 'STATION 7']
+            batch = NullBatch()
+            cases.append(('mydt ' + name, lambda t=dataAry[6]: listener.mydt(t)))
+            cases.append(('dbtime ' + name, lambda t=dataAry[6]: listener.clock.text(t)))
+            cases.append(('row ' + name, lambda a=row, b=batch: listener.insertTransactionIntoDb(a, b)))
+            cases.append(('format ' + name, lambda a=tuple(dataAry): listener.formatPacket("TX ", "%d ", a)))
+    return cases
+
+def timeCase( func ):
+    """
+    Best microseconds per call
+    """
+    return min(timeit.repeat(func, number=loops, repeat=repeats)) * 1e6 / loops
+
+def loadBaseline( filename ):
+    try:
+        f = open(filename)
+    except IOError:
+        return None
+    try:
+        return json.load(f)
+    finally:
+        f.close()
+
+def saveBaseline( filename, results ):
+    f = open(filename, 'w')
+    try:
+        json.dump({'version': version, 'python': platform.python_version(),
+                   'machine': platform.node(), 'loops': loops, 'results': results},
+                  f, indent=1, sort_keys=True)
+    finally:
+        f.close()
+
+def usage():
+    print "Usage: bench_hotpath.py [-s] [-j journal] [-b baseline]"
+    print "  -s  store this run as the baseline"
+    print "  -j  take the packets from a recorded journal instead of", fixtureFile
+    print "  -b  baseline file (%s)" % baselineFile
+
+def main(argv):
+
+    print version
+    try:
+        opts, args = getopt.getopt(argv, 'hsj:b:')
+    except getopt.GetoptError, e:
+        print e
+        usage()
+        return 2
+    opts = dict(opts)
+    if ('-h' in opts):
+        usage()
+        return 0
+    baseline = opts.get('-b', baselineFile)
+
+    # the hot path functions, needs the same environment as the listener
+    listener = imp.load_source('pts_listener', listenerFile)
+    # debug output off, as in production
+    listener.console.level = listener.WARN
+    if ('-j' in opts):
+        fixtures = journalFixtures(opts['-j'])
+    else:
+        fixtures = loadFixtures(fixtureFile)
+
+    results = {}
+    for name, func in buildCases(listener, fixtures):
+        results[name] = timeCase(func)
+
+    previous = loadBaseline(baseline)
+    if (previous != None and previous.get('machine') != platform.node()):
+        print "Baseline was stored on", previous.get('machine'), "- compare with care"
+    regressions = 0
+    for name in sorted(results.keys()):
+        us = results[name]
+        line = "%-24s %8.3f us" % (name, us)
+        if (previous != None and name in previous['results']):
+            old = previous['results'][name]
+            change = (us - old) / old
+            line += "  baseline %8.3f us  %+6.1f%%" % (old, change * 100)
+            if (change > tolerance):
+                line += "  REGRESSION"
+                regressions += 1
+        print line
+
+    if ('-s' in opts):
+        saveBaseline(baseline, results)
+        print "Baseline stored in", baseline
+        return 0
+    if (regressions > 0):
+        print regressions, "cases slower than the baseline by more than %d%%" % (tolerance * 100)
+        return 1
+    return 0
+
+if __name__ == "__main__":
+    sys.exit(main(sys.argv[1:]))
@@ -0,0 +1,282 @@
+# bench_listener.py
+# Pneumatic Tube System end-to-end listener benchmark
+# Drives pts_listener_v1.49.py with traffic from pts_generator.py
+# By MS Technology Solutions LLC
+# For Colombo Pneumatic Tube Systems Inc
+#
+# The listener runs in this process against MySQL (its own connectDb) or
+# an SQLite file standing in for pts_datalog, with its packet logs, journal,
+# spill files and spool in a scratch directory.  The generator runs as a
+# separate process so it does not compete with the listener for the
+# interpreter lock.  Both plan the run from the same seed, so the transaction
+# numbers that were sent are known here; EventBatch.writeGroups is wrapped
+# to time every committed transaction row.  When the generator is done and
+# the writers have gone quiet the listener is interrupted like Ctrl+C.
+#
+# Reported: packets sent and received, drop rate, sustained packets per
+# second, transaction rows committed and missing, and the percentiles of
+# the time from the planned send to the commit of each transaction row.
+#
+# History:
+# v1.00     17-Oct-2026  Initial Release
+# v1.01     17-Oct-2026  Statements from pts_sql
+# v1.02     17-Oct-2026  rowcount on the SQLite cursor
+# v1.03     17-Oct-2026  Own UDP port, no metrics endpoint, beside a running listener
+version = 'bench_listener.py version 1.03 17-Oct-26'
+#
+# settings
+listenerFile = 'pts_listener_v1.49.py'
+benchSystem = 200 # first system number used by the benchmark, away from real systems
+benchPort = 11236 # UDP port of the benchmarked listener, away from a running one on 1236
+settleTime = 2 # seconds without a commit before the run is over
+startDelay = 1 # seconds for the listener to open its socket before the generator starts
+#
+import getopt
+import imp
+import os
+import shutil
+import sqlite3
+import subprocess
+import sys
+import tempfile
+import thread
+import threading
+import time
+import pts_generator
+from pts_sink import EventBatch
+from pts_sql import INSERT_TRANSACTION, SELECT_MAX_TRANS_RANGE
+
+SQLITE_SCHEMA = [
+    "CREATE TABLE eventlog (TransNum INTEGER, System INTEGER, EventType INTEGER, EventStart DATETIME, "
+    "Duration INTEGER, Source INTEGER, Destination INTEGER, Status INTEGER, Flags INTEGER, "
+    "MainStationName TEXT, SubStationName TEXT, ReceiverID INTEGER, ReceiveTime DATETIME)",
+    "CREATE INDEX eventlog_trans ON eventlog (System, TransNum)",
+    "CREATE TABLE station (system INTEGER, station INTEGER, station_name TEXT)",
+    "CREATE TABLE parameters (ParID INTEGER PRIMARY KEY AUTOINCREMENT, ParName TEXT, "
+    "ParVal1 INTEGER, ParVal2 INTEGER)",
+]
+
+class SqliteCursor(object):
+    """
+    MySQLdb style cursor on an SQLite connection
+    Turns %s markers into ? and the transaction statements into calls
+    """
+    def __init__(self, conn):
+        self.conn = conn
+        self.cursor = conn.cursor()
+
+    def execute(self, sql, params=()):
+        command = sql.strip().upper()
+        if (command == 'START TRANSACTION'):
+            return
+        if (command == 'COMMIT'):
+            self.conn.commit()
+            return
+        if (command == 'ROLLBACK'):
+            self.conn.rollback()
+            return
+        self.cursor.execute(sql.replace('%s', '?'), params or ())
+
+    def executemany(self, sql, rows):
+        self.cursor.executemany(sql.replace('%s', '?'), rows)
+
+    @property
+    def rowcount(self):
+        return self.cursor.rowcount
+
+    def fetchone(self):
+        return self.cursor.fetchone()
+
+    def fetchall(self):
+        return self.cursor.fetchall()
+
+    def close(self):
+        self.cursor.close()
+
+class SqliteConnection(object):
+    """
+    The parts of a MySQLdb connection the listener uses
+    """
+    def __init__(self, filename):
+        self.conn = sqlite3.connect(filename, timeout=30, check_same_thread=False)
+
+    def cursor(self):
+        return SqliteCursor(self.conn)
+
+    def ping(self, reconnect=False):
+        pass
+
+    def commit(self):
+        self.conn.commit()
+
+    def rollback(self):
+        self.conn.rollback()
+
+    def close(self):
+        self.conn.close()
+
+def createSqlite( filename ):
+    """
+    Empty stand-in database with the tables the listener writes
+    """
+    conn = sqlite3.connect(filename)
+    for sql in SQLITE_SCHEMA:
+        conn.execute(sql)
+    conn.commit()
+    conn.close()
+
+def firstFreeTrans( connect, systems ):
+    """
+    Transaction number above everything the benchmark systems already have
+    """
+    conn = connect()
+    try:
+        cursor = conn.cursor()
+        cursor.execute(SELECT_MAX_TRANS_RANGE, (systems[0], systems[-1]))
+        row = cursor.fetchone()
+        cursor.close()
+    finally:
+        conn.close()
+    return int(row[0] or 0) + 1
+
+class CommitTimes(object):
+    """
+    Commit time of every transaction row, from a wrapped EventBatch.writeGroups
+    """
+    def __init__(self):
+        self.times = {}
+        self.last = time.time()
+        self.original = EventBatch.writeGroups
+
+    def install(self):
+        original = self.original
+        commits = self
+        def writeGroups(batch, groups):
+            original(batch, groups)
+            now = time.time()
+            for sql, rows in groups:
+                if (sql == INSERT_TRANSACTION):
+                    for row in rows:
+                        # (TransNum, System, EventType, ...)
+                        commits.times.setdefault((row[1], row[0], row[2]), now)
+            commits.last = now
+        EventBatch.writeGroups = writeGroups
+
+    def uninstall(self):
+        EventBatch.writeGroups = self.original
+
+def percentile( values, p ):
+    """
+    Value below which p percent of the sorted values lie
+    """
+    if (len(values) == 0):
+        return 0.0
+    return values[min(len(values) - 1, int(len(values) * p / 100.0))]
+
+def runGenerator( argv, start, result ):
+    """
+    Run the generator process, then wait for the writers to go quiet and
+    stop the listener in the main thread
+    """
+    try:
+        time.sleep(max(0, start - time.time() - 0.5))
+        cmd = [sys.executable, 'pts_generator.py'] + argv + ['-a', repr(start)]
+        result['generator'] = subprocess.Popen(cmd, stdout=subprocess.PIPE).communicate()[0]
+        result['sendEnd'] = time.time()
+        commits = result['commits']
+        while (time.time() - max(commits.last, result['sendEnd']) < settleTime):
+            time.sleep(0.1)
+    finally:
+        thread.interrupt_main()
+
+def usage():
+    print "Usage: bench_listener.py [-m mysql|sqlite] [-w writers] [-v] [generator options]"
+    print "  -m  database, the listener's MySQL or an SQLite stand-in (sqlite)"
+    print "  -w  database writer threads (1)"
+    print "  -v  keep the listener's info output on the console"
+    print "  generator options -s -r -d -b -l -o -x as in pts_generator.py"
+
+def main(argv):
+
+    print version
+    try:
+        opts, args = getopt.getopt(argv, 'hm:w:vs:r:d:b:l:o:x:')
+    except getopt.GetoptError, e:
+        print e
+        usage()
+        return 2
+    opts = dict(opts)
+    if ('-h' in opts):
+        usage()
+        return 0
+
+    systems = int(opts.get('-s', pts_generator.systems))
+    rate = float(opts.get('-r', pts_generator.rate))
+    seconds = float(opts.get('-d', pts_generator.seconds))
+    generator = pts_generator.TrafficGenerator(systems, rate, opts.get('-b', pts_generator.shape),
+                                               float(opts.get('-l', pts_generator.loss)),
+                                               float(opts.get('-o', pts_generator.reorder)),
+                                               int(opts.get('-x', pts_generator.seed)), benchSystem)
+
+    listener = imp.load_source('pts_listener', listenerFile)
+    listener.dbWriters = int(opts.get('-w', listener.dbWriters))
+    # never share the port or the metrics endpoint of a production listener
+    listener.listenPort = benchPort
+    listener.metricsPort = 0
+    if ('-v' not in opts):
+        listener.console.level = listener.WARN
+    # packet logs, journal, spill files and spool out of the way
+    scratch = tempfile.mkdtemp(prefix='pts_bench_')
+    listener.logFileName = lambda lognum: os.path.join(scratch, 'pts_' + str(lognum) + '.log')
+    listener.journalDir = lambda: scratch
+    listener.spoolDir = lambda: scratch
+    listener.spillFileName = lambda num: os.path.join(scratch, 'pts_queue_' + str(num) + '.spill')
+    if (opts.get('-m', 'sqlite') == 'sqlite'):
+        filename = os.path.join(scratch, 'pts_datalog.sqlite')
+        createSqlite(filename)
+        listener.connectDb = lambda: SqliteConnection(filename)
+    generator.firstTrans = firstFreeTrans(listener.connectDb, generator.systems)
+
+    # the same plan the generator process sends
+    start = time.time() + startDelay
+    packets = generator.plan(seconds, start)
+    expected = {}
+    for p in packets:
+        if (p.command == 'X' and not p.lost):
+            expected[(p.system, p.transNum, p.status)] = start + p.offset
+
+    commits = CommitTimes()
+    commits.install()
+    result = {'commits': commits}
+    genArgs = ['-s', str(systems), '-f', str(benchSystem), '-r', str(rate), '-d', str(seconds), '-b', generator.shape,
+               '-l', str(generator.loss), '-o', str(generator.reorder), '-x', str(generator.seed),
+               '-t', str(generator.firstTrans), '-p', str(benchPort)]
+    control = threading.Thread(target=runGenerator, args=(genArgs, start, result))
+    control.daemon = True
+    control.start()
+    try:
+        listener.main()
+    except (KeyboardInterrupt, SystemExit):
+        pass
+    commits.uninstall()
+    control.join(5)
+
+    sent = len([p for p in packets if not p.lost])
+    received = sum([h.count for h in listener.HANDLERS.values()])
+    latencies = sorted([commits.times[key] - t for key, t in expected.items() if key in commits.times])
+    missing = len(expected) - len(latencies)
+    elapsed = max(result.get('sendEnd', time.time()) - start, 0.001)
+    print
+    print result.get('generator', '').strip()
+    print "sent %d packets, received %d, drop rate %.2f%%" % \
+          (sent, received, (sent - received) * 100.0 / max(sent, 1))
+    print "sustained %d packets/s received, %d packets/s planned" % (received / elapsed, rate)
+    print "transactions committed %d of %d, missing %d" % (len(latencies), len(expected), missing)
+    print "send to commit latency ms  p50 %.1f  p90 %.1f  p99 %.1f  max %.1f" % \
+          (percentile(latencies, 50) * 1e3, percentile(latencies, 90) * 1e3,
+           percentile(latencies, 99) * 1e3, percentile(latencies, 100) * 1e3)
+    shutil.rmtree(scratch, True)
+    return 0
+
+if __name__ == "__main__":
+    sys.exit(main(sys.argv[1:]))
@@ -0,0 +1,95 @@
+# pts_clock.py
+# Pneumatic Tube System SEC_TIMER conversion
+# By MS Technology Solutions LLC
+# For Colombo Pneumatic Tube Systems Inc
+#
+# Diverters send times as seconds since 01-Jan-1980 (SEC_TIMER).  mydt()
+# built a datetime from fromordinal() plus a timedelta for every packet,
+# which MySQLdb then turned back into text for the statement.  PtsClock
+# splits the seconds into a day number and a second of the day with
+# integer arithmetic, looks the day up in a cache of its 'YYYY-MM-DD '
+# prefix and date parts (nearly every packet of a burst is on the same
+# day), and appends the time of day from two small precomputed tables.
+# text() gives the DATETIME literal to bind directly; datetime() still
+# gives a datetime for code that compares with rows read back.
+#
+# History:
+# v1.00     17-Oct-2026  Initial Release
+#
+import datetime
+
+# ordinal of 01-Jan-1980, day 0 of the PTS clock
+EPOCH_ORDINAL = 722815
+PTS_EPOCH = datetime.datetime(1980, 1, 1)
+# 'HH:MM' of every minute of a day and ':SS' of every second of a minute
+MINUTES = ['%02d:%02d' % (m // 60, m % 60) for m in range(1440)]
+SECONDS = [':%02d' % s for s in range(60)]
+
+class PtsClock(object):
+    """
+    SEC_TIMER to DATETIME conversion with a per day cache
+      maxDays - days cached before the cache starts over
+    Safe to share between threads, a day is at worst computed twice
+    """
+    def __init__(self, maxDays=64):
+        self.maxDays = maxDays
+        # day number -> ('YYYY-MM-DD ', year, month, day)
+        self.days = {}
+        # statistics
+        self.misses = 0
+
+    def day(self, dayNum):
+        """
+        Cache entry of a day number
+        """
+        entry = self.days.get(dayNum)
+        if (entry == None):
+            if (len(self.days) >= self.maxDays):
+                self.days = {}
+            date = datetime.date.fromordinal(EPOCH_ORDINAL + dayNum)
+            entry = (date.strftime('%Y-%m-%d '), date.year, date.month, date.day)
+            self.days[dayNum] = entry
+            self.misses += 1
+        return entry
+
+    def text(self, d):
+        """
+        'YYYY-MM-DD HH:MM:SS' of a SEC_TIMER value, ready to bind to a DATETIME
+        """
+        secs = d % 86400
+        return self.day(d // 86400)[0] + MINUTES[secs // 60] + SECONDS[secs % 60]
+
+    def datetime(self, d):
+        """
+        datetime of a SEC_TIMER value, as mydt() returned it
+        """
+        entry = self.day(d // 86400)
+        secs = d % 86400
+        return datetime.datetime(entry[1], entry[2], entry[3], secs // 3600, secs // 60 % 60, secs % 60)
+
+    def texts(self, values):
+        """
+        text() of a sequence of SEC_TIMER values, for replay and backfill batches
+        """
+        days = self.days
+        day = self.day
+        result = []
+        append = result.append
+        for d in values:
+            dayNum, secs = divmod(d, 86400)
+            entry = days.get(dayNum) or day(dayNum)
+            append(entry[0] + MINUTES[secs // 60] + SECONDS[secs % 60])
+        return result
+
+    def datetimes(self, values):
+        """
+        datetime() of a sequence of SEC_TIMER values
+        """
+        return [self.datetime(d) for d in values]
+
+    def seconds(self, dt):
+        """
+        SEC_TIMER value of a datetime, the inverse of datetime()
+        """
+        delta = dt - PTS_EPOCH
+        return delta.days * 86400 + delta.seconds
@@ -0,0 +1,207 @@
+# pts_console.py
+# Pneumatic Tube System leveled, rate limited console output
+# By MS Technology Solutions LLC
+# For Colombo Pneumatic Tube Systems Inc
+#
+# The listener used to print every decoded packet field by field from the
+# receiver thread, and on the Windows console a blocking write to the
+# terminal was the slowest step of a packet.  Console takes a record
+# (level, category, format, args) instead: records below the level are
+# discarded before anything is formatted, a category can be sampled to
+# every Nth record, and the rest go into a bounded queue.  A thread formats
+# them and writes them in blocks with one flush, at most maxRate debug/info
+# lines per second; what is over the rate or does not fit into the queue is
+# counted instead of printed.  Warnings and errors are never sampled or
+# rate limited.
+#
+# Until start() the records are written synchronously, so tools that load
+# the listener module (pts_replay.py) keep their output in order.
+#
+# The listener parts in their own modules (pts_sink, pts_spool, ...) take
+# a log function(level, fmt, *args): Console.logger(category) for the
+# listener, printLog when they are used on their own.
+#
+# History:
+# v1.00     17-Oct-2026  Initial Release
+# v1.01     17-Oct-2026  Log functions for the listener modules (logger, printLog)
+#
+import Queue
+import sys
+import threading
+import time
+
+DEBUG = 10
+INFO = 20
+WARN = 30
+ERROR = 40
+
+LEVELS = {'debug': DEBUG, 'info': INFO, 'warn': WARN, 'error': ERROR}
+
+def printLog(level, fmt, *args):
+    """
+    Log function of a module used without a Console, prints every line
+    """
+    if (len(args) > 0):
+        fmt = fmt % args
+    print fmt
+
+class Console(object):
+    """
+    Asynchronous console writer
+      level     - lowest level written, one of DEBUG, INFO, WARN, ERROR
+      sample    - {category: n} writes every nth record of a category,
+                  0 none of them; categories not listed are all written
+      maxRate   - debug/info lines per second, 0 for no limit
+      queueSize - records waiting for the writer thread
+      stream    - file to write to, None for the current sys.stdout
+    """
+    def __init__(self, level=INFO, sample=None, maxRate=200, queueSize=10000, stream=None):
+        self.level = level
+        self.sample = dict(sample or {})
+        self.maxRate = maxRate
+        self.stream = stream
+        self.queue = Queue.Queue(queueSize)
+        self.thread = None
+        self.stopped = threading.Event()
+        # records seen per sampled category, approximate across threads
+        self.counts = {}
+        # rate window of the writer thread
+        self.second = 0
+        self.lines = 0
+        self.suppressedNow = 0
+        # statistics
+        self.written = 0
+        self.sampled = 0
+        self.dropped = 0
+        self.suppressed = 0
+
+    def enabled(self, level):
+        """
+        True if records of a level are written, to skip building costly arguments
+        """
+        return (level >= self.level)
+
+    def log(self, level, category, fmt, *args):
+        """
+        Queue one record; fmt is a % format for args, or a function(*args)
+        returning the line
+        """
+        if (level < self.level):
+            return
+        if (level < WARN):
+            every = self.sample.get(category, 1)
+            if (every != 1):
+                n = self.counts.get(category, 0) + 1
+                self.counts[category] = n
+                if (every <= 0 or n % every != 0):
+                    self.sampled += 1
+                    return
+        record = (level, category, fmt, args)
+        if (self.thread == None):
+            self.emit([record])
+            return
+        try:
+            self.queue.put_nowait(record)
+        except Queue.Full:
+            self.dropped += 1
+
+    def logger(self, category):
+        """
+        Log function(level, fmt, *args) writing records of one category
+        """
+        return lambda level, fmt, *args: self.log(level, category, fmt, *args)
+
+    def start(self):
+        """
+        Write from a thread from now on
+        """
+        self.thread = threading.Thread(target=self.run, name='console')
+        self.thread.daemon = True
+        self.thread.start()
+
+    def run(self):
+        while (not self.stopped.isSet()):
+            try:
+                records = [self.queue.get(True, 1)]
+            except Queue.Empty:
+                continue
+            self.emit(records + self.takeQueued())
+        # what was logged before stop()
+        self.emit(self.takeQueued())
+
+    def takeQueued(self):
+        """
+        Everything waiting in the queue, without blocking
+        """
+        records = []
+        try:
+            while (True):
+                records.append(self.queue.get_nowait())
+        except Queue.Empty:
+            pass
+        return records
+
+    def emit(self, records):
+        """
+        Format and write a block of records with one flush
+        """
+        out = []
+        for level, category, fmt, args in records:
+            if (level < WARN and not self.withinRate(out)):
+                continue
+            try:
+                if (callable(fmt)):
+                    out.append(fmt(*args))
+                elif (len(args) > 0):
+                    out.append(fmt % args)
+                else:
+                    out.append(fmt)
+            except:
+                out.append("%s %r %r" % (category, fmt, args))
+        if (len(out) == 0):
+            return
+        stream = self.stream or sys.stdout
+        try:
+            stream.write('\n'.join(out) + '\n')
+            stream.flush()
+        except (IOError, ValueError):
+            # the console went away, there is nobody to tell
+            pass
+        self.written += len(out)
+
+    def withinRate(self, out):
+        """
+        Count a debug/info line against the current second, False if over maxRate
+        """
+        if (self.maxRate <= 0):
+            return True
+        second = int(time.time())
+        if (second != self.second):
+            if (self.suppressedNow > 0):
+                out.append("... %d lines suppressed" % self.suppressedNow)
+            self.second = second
+            self.lines = 0
+            self.suppressedNow = 0
+        if (self.lines >= self.maxRate):
+            self.suppressedNow += 1
+            self.suppressed += 1
+            return False
+        self.lines += 1
+        return True
+
+    def stop(self):
+        """
+        Write what is queued and stop the thread
+        """
+        if (self.thread == None):
+            return
+        self.stopped.set()
+        self.thread.join(5)
+        self.thread = None
+
+    def stats(self):
+        """
+        Console metrics as a dictionary
+        """
+        return {'written': self.written, 'sampled': self.sampled, 'dropped': self.dropped,
+                'suppressed': self.suppressed, 'queued': self.queue.qsize()}
@@ -0,0 +1,193 @@
+# pts_dbpool.py
+# Pneumatic Tube System database connection pool
+# By MS Technology Solutions LLC
+# For Colombo Pneumatic Tube Systems Inc
+#
+# Connections stay open between packets instead of being opened per burst
+# and closed after 5 seconds (v1.02/v1.04).  The 8 hour wait_timeout is
+# handled by pinging a connection when it is borrowed and by closing
+# connections that sat idle longer than maxIdle seconds; a dead connection
+# is replaced transparently and counted as a reconnect.
+#
+# The lock only guards the idle list and the counters.  Pings and closes
+# go over the network without a timeout, so they run after it is released:
+# one hung connection must not hold up every thread that borrows.  Expired
+# connections are reaped by the threads that release connections, never
+# by the receiver thread.
+#
+# History:
+# v1.00     17-Oct-2026  Initial Release
+# v1.01     17-Oct-2026  Add isDatabaseDown for the write-ahead spool
+# v1.02     17-Oct-2026  Ping and close outside the lock, reap on release
+# v1.03     17-Oct-2026  Reconnects reported through a log function
+#
+import sys
+import threading
+import time
+from pts_console import printLog, WARN
+
+# MySQL client errors meaning the connection is gone
+CONNECTION_LOST = (2006, 2013, 2055) # server gone away, lost connection, lost at reading
+# MySQL client errors meaning a connection cannot be opened
+CONNECT_FAILED = (2002, 2003, 2005) # no local socket, can't connect, unknown host
+
+def isConnectionLost( err ):
+    """
+    True if a database exception means the connection has to be replaced
+    """
+    args = getattr(err, 'args', ())
+    return (len(args) > 0 and args[0] in CONNECTION_LOST)
+
+def isDatabaseDown( err ):
+    """
+    True if a database exception means the server cannot be reached at all
+    """
+    args = getattr(err, 'args', ())
+    return (len(args) > 0 and (args[0] in CONNECTION_LOST or args[0] in CONNECT_FAILED))
+
+class ConnectionPool(object):
+    """
+    Shared pool of open connections with ping-on-borrow
+      connect - function() returning a new DB-API connection
+      size    - idle connections kept open
+      maxIdle - seconds an idle connection is kept before it is closed
+      log     - function(level, fmt, *args), None to print
+    """
+    def __init__(self, connect, size=4, maxIdle=3600, log=None):
+        self.connect = connect
+        self.log = log or printLog
+        self.size = size
+        self.maxIdle = maxIdle
+        self.lock = threading.Lock()
+        # idle connections as (conn, release time), most recent last
+        self.idle = []
+        # statistics
+        self.opened = 0
+        self.reconnects = 0
+        self.borrows = 0
+        self.expired = 0
+
+    def borrow(self):
+        """
+        Return a live connection, reusing an idle one when possible
+        """
+        self.lock.acquire()
+        self.borrows += 1
+        self.lock.release()
+        while 1:
+            conn = self.takeIdle()
+            if (conn == None):
+                return self.open()
+            try:
+                conn.ping()
+                return conn
+            except:
+                self.log(WARN, "Db connection lost, reconnecting  %s", sys.exc_info()[0])
+                self.lock.acquire()
+                self.reconnects += 1
+                self.lock.release()
+                self.closeConnection(conn)
+
+    def takeIdle(self):
+        """
+        Remove and return the most recent idle connection that has not
+        expired, None if there is none
+        """
+        expired = []
+        conn = None
+        self.lock.acquire()
+        try:
+            now = time.time()
+            while (len(self.idle) > 0):
+                candidate, released = self.idle.pop()
+                if (now - released > self.maxIdle):
+                    self.expired += 1
+                    expired.append(candidate)
+                else:
+                    conn = candidate
+                    break
+        finally:
+            self.lock.release()
+        for candidate in expired:
+            self.closeConnection(candidate)
+        return conn
+
+    def open(self):
+        """
+        Open a new connection
+        """
+        conn = self.connect()
+        self.lock.acquire()
+        self.opened += 1
+        self.lock.release()
+        return conn
+
+    def release(self, conn):
+        """
+        Give a healthy connection back to the pool
+        """
+        self.lock.acquire()
+        try:
+            if (len(self.idle) < self.size):
+                self.idle.append((conn, time.time()))
+                conn = None
+        finally:
+            self.lock.release()
+        if (conn != None):
+            self.closeConnection(conn)
+        self.reap()
+
+    def replace(self, conn):
+        """
+        Close a broken connection and return a new one
+        """
+        self.closeConnection(conn)
+        self.lock.acquire()
+        self.reconnects += 1
+        self.lock.release()
+        return self.open()
+
+    def reap(self):
+        """
+        Close idle connections older than maxIdle
+        """
+        expired = []
+        self.lock.acquire()
+        try:
+            now = time.time()
+            keep = []
+            for conn, released in self.idle:
+                if (now - released > self.maxIdle):
+                    self.expired += 1
+                    expired.append(conn)
+                else:
+                    keep.append((conn, released))
+            self.idle = keep
+        finally:
+            self.lock.release()
+        for conn in expired:
+            self.closeConnection(conn)
+
+    def closeAll(self):
+        """
+        Close every idle connection
+        """
+        self.lock.acquire()
+        idle = self.idle
+        self.idle = []
+        self.lock.release()
+        for conn, released in idle:
+            self.closeConnection(conn)
+
+    def closeConnection(self, conn):
+        try:
+            conn.close()
+        except:
+            pass
+
+    def stats(self):
+        """
+        Pool metrics as a dictionary
+        """
+        return {'opened': self.opened, 'reconnects': self.reconnects, 'borrows': self.borrows,
+                'expired': self.expired, 'idle': len(self.idle)}
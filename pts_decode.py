@@ -0,0 +1,219 @@
+# pts_decode.py
+# Pneumatic Tube System packet decoder
+# Precompiled struct layouts for each Mainstream UDP command byte
+# By MS Technology Solutions LLC
+# For Colombo Pneumatic Tube Systems Inc
+#
+# Each decode function returns a list with the same element order as the
+# original parse functions in pts_listener_v1.48.py so the rest of the
+# listener (station name enrichment, db inserts, logging) is unchanged.
+# Every decoder takes the receive buffer directly (str, bytearray or
+# memoryview) and pulls all fields out with a single unpack_from call.
+#
+# Mainstream v500 firmware (pts_listener_v1.5.py) inserts a device id byte
+# after the system number and a sequence number byte after the station, so
+# the command moves from byte 2 to byte 3 and the body shifts by 2 bytes.
+# The v1.5 layouts skip those two bytes with pad bytes so both firmware
+# generations decode into the same element order.
+#
+# History:
+# v1.00     17-Oct-2026  Initial Release
+# v1.01     17-Oct-2026  Add v1.5 layouts and per source layout detection
+# v1.02     17-Oct-2026  Layout changes reported through a log function
+#
+import struct
+
+# Common header: system, device type, command, station, MS_TIMER
+# 'E' heartbeat: header, SEC_TIMER, 12 status bytes
+HEARTBEAT = struct.Struct('<BBBBLL12B')
+# 'X' transaction and 'V' event: header, TransNum, start time, duration,
+# source, dest, status, flags
+TRANSACTION = struct.Struct('<BBBBLLLHBBBB')
+# 'W' secure removal and 'w' card scan: header, TransNum, time, card bytes 16..21
+SECURE_NEW = struct.Struct('<BBBBLLL6B')
+# legacy secure card ID also needs byte 22 (fixed 5th byte of the card number)
+SECURE_OLD = struct.Struct('<BBBBLLL7B')
+# 'S' parameter block: header, .sysid, 10 station names of 11 chars (12 apart),
+# card left-3 digits, card right-9 min and max
+PARBLOCK = struct.Struct('<BBBBLB17x' + '11sx' * 10 + '133xBLL')
+# device type and command bytes only, works the same on str and bytearray
+PEEK = struct.Struct('<xBc')
+# system number, first byte of every layout
+SYSTEM = struct.Struct('<B')
+
+def decodeHeartbeat( buf ):
+    """
+    Decode a heartbeat packet into individual elements
+    """
+    return list(HEARTBEAT.unpack_from(buf))
+
+def decodeTransaction( buf ):
+    """
+    Decode a transaction or event packet into individual elements
+    """
+    return list(TRANSACTION.unpack_from(buf))
+
+def decodeSecureRemoval( buf ):
+    """
+    Decode a secure removal or card scan packet into individual elements
+    """
+    if (PEEK.unpack_from(buf)[0] == 4): # new way
+        f = SECURE_NEW.unpack_from(buf)
+        # 7 Card ID, 8 Status, 9 Flags
+        return [f[0], f[1], f[2], f[3], f[4], f[5], f[6],
+                (f[7]<<32) + (f[8]<<24) + (f[9]<<16) + (f[10]<<8) + f[12],
+                f[11], 0]
+    # old way device type 1
+    f = SECURE_OLD.unpack_from(buf)
+    CardID = f[7] + (f[8]<<8) + (f[9]<<16) + (f[10]<<24) + (f[13]<<32)
+    if (CardID < 154000000000):
+        CardID += 4294967296 # add 0x100000000
+    return [f[0], f[1], f[2], f[3], f[4], f[5], f[6], CardID, f[11], 0]
+
+def decodeParBlock( buf ):
+    """
+    Decode a parameter block into individual elements
+    Station names are taken up to the embedded null
+    """
+    f = list(PARBLOCK.unpack_from(buf))
+    for i in range(6, 16):
+        f[i] = f[i].split("\0")[0]
+    return f
+
+# decoder per command byte
+DECODERS = {
+    'E': decodeHeartbeat,
+    'S': decodeParBlock,
+    'X': decodeTransaction,
+    'W': decodeSecureRemoval,
+    'w': decodeSecureRemoval,
+    'V': decodeTransaction,
+}
+
+def decodePacket( buf ):
+    """
+    Decode any known packet, returns None for unknown command bytes
+    """
+    decoder = DECODERS.get(PEEK.unpack_from(buf)[1])
+    if (decoder == None):
+        return None
+    return decoder(buf)
+
+# Mainstream v500 layouts, device id and sequence number skipped
+HEARTBEAT_V15 = struct.Struct('<BxBBBxLL12B')
+TRANSACTION_V15 = struct.Struct('<BxBBBxLLLHBBBB')
+# card ID low 4 bytes, status, flags, card ID 5th byte
+SECURE_V15 = struct.Struct('<BxBBBxLLLLBBB')
+PARBLOCK_V15 = struct.Struct('<BxBBBxLB17x' + '11sx' * 10 + '133xBLL')
+# card scan keeps device id and sequence number, see parseCardScan in v1.5
+CARDSCAN_V15 = struct.Struct('<BBBBBBLLLBBL')
+
+def decodeHeartbeatV15( buf ):
+    """
+    Decode a v1.5 heartbeat packet into individual elements
+    """
+    return list(HEARTBEAT_V15.unpack_from(buf))
+
+def decodeTransactionV15( buf ):
+    """
+    Decode a v1.5 transaction or event packet into individual elements
+    """
+    return list(TRANSACTION_V15.unpack_from(buf))
+
+def decodeSecureRemovalV15( buf ):
+    """
+    Decode a v1.5 secure removal packet into individual elements
+    """
+    f = SECURE_V15.unpack_from(buf)
+    # 7 Card ID, 8 Status, 9 Flags
+    return [f[0], f[1], f[2], f[3], f[4], f[5], f[6], f[7] + (f[10]<<32), f[8], f[9]]
+
+def decodeParBlockV15( buf ):
+    """
+    Decode a v1.5 parameter block into individual elements
+    """
+    f = list(PARBLOCK_V15.unpack_from(buf))
+    for i in range(6, 16):
+        f[i] = f[i].split("\0")[0]
+    return f
+
+def decodeCardScanV15( buf ):
+    """
+    Decode a v1.5 card scan packet into individual elements
+    """
+    return list(CARDSCAN_V15.unpack_from(buf))
+
+class Layout(object):
+    """
+    Header layout of one firmware generation
+    """
+    def __init__(self, name, commandOffset, decoders):
+        self.name = name
+        self.peek = struct.Struct('<%dxc' % commandOffset)
+        self.decoders = decoders
+
+    def command(self, buf):
+        """
+        Return the command byte, or None if this layout does not know it
+        """
+        if (len(buf) < self.peek.size):
+            return None
+        cmd = self.peek.unpack_from(buf)[0]
+        if (cmd in self.decoders):
+            return cmd
+        return None
+
+V144 = Layout('v1.44', 2, DECODERS)
+V15 = Layout('v1.5', 3, {
+    'E': decodeHeartbeatV15,
+    'S': decodeParBlockV15,
+    'X': decodeTransactionV15,
+    'W': decodeSecureRemovalV15,
+    'V': decodeTransactionV15,
+    'K': decodeCardScanV15,
+})
+
+def guessLayout( buf ):
+    """
+    Pick the layout from the position of the command byte
+    Byte 3 is a station number in v1.44 and byte 2 a device type in v1.5,
+    neither is ever a command letter, so at most one layout matches
+    """
+    if (V144.command(buf) != None):
+        return V144
+    if (V15.command(buf) != None):
+        return V15
+    return None
+
+class LayoutDetector(object):
+    """
+    Remembers the layout of each (source address, system number)
+      log - function(fmt, *args) reporting a detected layout, None to print it
+    """
+    def __init__(self, log=None):
+        self.cache = {}
+        self.log = log
+
+    def detect(self, buf, source):
+        """
+        Return (layout, command) for a packet, (None, None) if unknown
+        """
+        if (len(buf) < 4):
+            return None, None
+        system = SYSTEM.unpack_from(buf)[0]
+        key = (source, system)
+        layout = self.cache.get(key)
+        if (layout != None):
+            cmd = layout.command(buf)
+            if (cmd != None):
+                return layout, cmd
+        # first packet or a firmware change
+        layout = guessLayout(buf)
+        if (layout == None):
+            return None, None
+        self.cache[key] = layout
+        if (self.log != None):
+            self.log("System %s at %s uses layout %s", system, source, layout.name)
+        else:
+            print "System", system, "at", source, "uses layout", layout.name
+        return layout, layout.command(buf)
@@ -0,0 +1,165 @@
+# pts_dedup.py
+# Pneumatic Tube System repeated card scan and transaction filters
+# By MS Technology Solutions LLC
+# For Colombo Pneumatic Tube Systems Inc
+#
+# The listener used to remember only the last card and time of any 'w'
+# scan, so two people scanning at different stations defeated the repeat
+# check.  ScanFilter remembers the last scan time per (system, station,
+# card).  Entries are expired by a hashed time wheel of one slot per second
+# of receive time: each scan puts its key into the slot of the current
+# second, and when the wheel comes around to a slot again the keys in it
+# that were not scanned since are forgotten.  Memory is bounded by the
+# scans of the last 'slots' seconds.
+#
+# Diverters resend transactions during a resync.  TransFilter remembers the
+# transaction numbers seen per (system, event type) as a ring bitmap over
+# the last 'span' numbers below the highest one, one bit per number, so a
+# resent 'X' packet is recognized without a database query.
+#
+# History:
+# v1.00     17-Oct-2026  Initial Release
+# v1.01     17-Oct-2026  Add TransFilter for resent transactions
+# v1.02     17-Oct-2026  TransFilter.forget for rows that could not be written
+#
+import time
+
+class ScanFilter(object):
+    """
+    Drops a card scan repeated at the same station within window seconds
+      window - seconds of scan time (packet time) between two scans that
+               count as one
+      slots  - seconds a key is remembered, at least window plus the
+               clock difference between the systems and this machine
+    Used from the receiver thread only
+    """
+    def __init__(self, window=1, slots=16):
+        self.window = window
+        self.slots = slots
+        # key -> [last scan time, receive second]
+        self.last = {}
+        # keys per receive second modulo slots
+        self.wheel = [[] for i in range(slots)]
+        self.tick = None
+        # statistics
+        self.scans = 0
+        self.repeats = 0
+        self.expired = 0
+
+    def repeat(self, key, scanTime):
+        """
+        Record a scan, True if it repeats the previous scan of the key
+        """
+        now = int(time.time())
+        if (now != self.tick):
+            self.advance(now)
+        self.scans += 1
+        entry = self.last.get(key)
+        if (entry == None):
+            self.last[key] = [scanTime, now]
+            self.wheel[now % self.slots].append(key)
+            return False
+        repeat = ((scanTime - entry[0]) <= self.window)
+        entry[0] = scanTime
+        if (entry[1] != now):
+            entry[1] = now
+            self.wheel[now % self.slots].append(key)
+        if (repeat):
+            self.repeats += 1
+        return repeat
+
+    def advance(self, now):
+        """
+        Expire the slots the wheel passed since the last scan
+        """
+        if (self.tick == None or now - self.tick >= self.slots or now < self.tick):
+            # idle for a whole turn (or the clock went back), forget everything
+            self.expired += len(self.last)
+            self.last = {}
+            self.wheel = [[] for i in range(self.slots)]
+            self.tick = now
+            return
+        for second in range(self.tick + 1, now + 1):
+            slot = second % self.slots
+            for key in self.wheel[slot]:
+                entry = self.last.get(key)
+                # keys scanned again since are in a newer slot as well
+                if (entry != None and entry[1] <= second - self.slots):
+                    del self.last[key]
+                    self.expired += 1
+            self.wheel[slot] = []
+        self.tick = now
+
+    def stats(self):
+        """
+        Filter metrics as a dictionary
+        """
+        return {'scans': self.scans, 'repeats': self.repeats, 'tracked': len(self.last),
+                'expired': self.expired}
+
+class TransFilter(object):
+    """
+    Transaction numbers seen per key as ring bitmaps
+      span - numbers remembered below the highest one of a key, multiple of 8
+    A key is only used by the writer thread of its system
+    """
+    def __init__(self, span=65536):
+        self.span = span
+        # key -> [bitmap, highest number]
+        self.rings = {}
+        # statistics
+        self.checked = 0
+        self.duplicates = 0
+        self.tooOld = 0
+
+    def seen(self, key, transNum):
+        """
+        Record a transaction number, True if it was recorded before
+        A number more than span below the highest one counts as new
+        """
+        self.checked += 1
+        ring = self.rings.get(key)
+        if (ring == None):
+            ring = self.rings[key] = [bytearray(self.span // 8), transNum]
+        elif (transNum > ring[1]):
+            self.clear(ring[0], ring[1] + 1, transNum)
+            ring[1] = transNum
+        elif (transNum <= ring[1] - self.span):
+            self.tooOld += 1
+            return False
+        i = transNum % self.span
+        mask = 1 << (i & 7)
+        if (ring[0][i >> 3] & mask):
+            self.duplicates += 1
+            return True
+        ring[0][i >> 3] |= mask
+        return False
+
+    def forget(self, key, transNum):
+        """
+        Take back a recorded number whose row was never written, so a
+        resend of it is written again
+        """
+        ring = self.rings.get(key)
+        if (ring == None or transNum > ring[1] or transNum <= ring[1] - self.span):
+            return
+        i = transNum % self.span
+        ring[0][i >> 3] &= ~(1 << (i & 7)) & 0xff
+
+    def clear(self, bits, first, last):
+        """
+        Clear the bits of first..last before the ring moves over them
+        """
+        if (last - first + 1 >= self.span):
+            bits[:] = bytearray(len(bits))
+            return
+        for n in range(first, last + 1):
+            i = n % self.span
+            bits[i >> 3] &= ~(1 << (i & 7)) & 0xff
+
+    def stats(self):
+        """
+        Filter metrics as a dictionary
+        """
+        return {'checked': self.checked, 'duplicates': self.duplicates, 'tooOld': self.tooOld,
+                'keys': len(self.rings)}
@@ -0,0 +1,255 @@
+# pts_gaps.py
+# Pneumatic Tube System transaction number gap detection
+# By MS Technology Solutions LLC
+# For Colombo Pneumatic Tube Systems Inc
+#
+# The auto-resync value lastCont (v1.46) only moved when the next
+# transaction number arrived exactly in order, so a single lost packet
+# stopped it and everything received after the loss was forgotten.
+# GapTracker keeps, per system, the runs of transaction numbers received
+# above the watermark (lastCont) as sorted lists of run starts and ends.
+# The watermark moves over every run that becomes contiguous with it, and
+# the ranges between the runs are exactly the transactions to ask the
+# diverter for again.
+#
+# In the parameters table a system has a 'TransHigh' row (ParVal1 system,
+# ParVal2 highest number received) and one 'TransGap<system>' row per
+# missing range (ParVal1 first, ParVal2 last missing number).
+#
+# History:
+# v1.00     17-Oct-2026  Initial Release
+# v1.01     17-Oct-2026  takeDirty limited to the systems of one writer
+# v1.02     17-Oct-2026  restore merges with the runs received before it
+# v1.03     17-Oct-2026  Given up gaps reported through a log function
+#
+import bisect
+from pts_console import printLog, WARN
+
+class TransRuns(object):
+    """
+    Transaction numbers of one system received above its watermark
+    """
+    def __init__(self, watermark=0):
+        self.watermark = watermark
+        # disjoint, non adjacent runs starts[i]..ends[i], ascending
+        self.starts = []
+        self.ends = []
+
+    def add(self, transNum):
+        """
+        Record a received number, returns False if it was already known
+        """
+        if (transNum <= self.watermark):
+            return False
+        starts = self.starts
+        ends = self.ends
+        i = bisect.bisect_right(starts, transNum) - 1
+        if (i >= 0 and ends[i] >= transNum):
+            return False
+        joinLeft = (i >= 0 and ends[i] == transNum - 1)
+        joinRight = (i + 1 < len(starts) and starts[i + 1] == transNum + 1)
+        if (joinLeft and joinRight):
+            ends[i] = ends[i + 1]
+            del starts[i + 1]
+            del ends[i + 1]
+        elif (joinLeft):
+            ends[i] = transNum
+        elif (joinRight):
+            starts[i + 1] = transNum
+        else:
+            starts.insert(i + 1, transNum)
+            ends.insert(i + 1, transNum)
+        if (starts[0] == self.watermark + 1):
+            self.skipGap()
+        return True
+
+    def addRun(self, first, last):
+        """
+        Record the received numbers first..last
+        """
+        first = max(first, self.watermark + 1)
+        if (last < first):
+            return
+        starts = self.starts
+        ends = self.ends
+        # runs i..j-1 overlap or touch first..last
+        i = bisect.bisect_left(ends, first - 1)
+        j = bisect.bisect_right(starts, last + 1)
+        if (i < j):
+            first = min(first, starts[i])
+            last = max(last, ends[j - 1])
+        starts[i:j] = [first]
+        ends[i:j] = [last]
+        if (starts[0] == self.watermark + 1):
+            self.skipGap()
+
+    def skipGap(self):
+        """
+        Move the watermark to the end of the first run
+        """
+        self.watermark = self.ends[0]
+        del self.starts[0]
+        del self.ends[0]
+
+    def moveWatermark(self, watermark):
+        """
+        Take an externally changed watermark
+        A lower one forgets what was received above it, so it is resent
+        """
+        if (watermark < self.watermark):
+            self.watermark = watermark
+            self.starts = []
+            self.ends = []
+            return
+        while (len(self.starts) > 0 and self.starts[0] <= watermark + 1):
+            watermark = max(watermark, self.ends[0])
+            del self.starts[0]
+            del self.ends[0]
+        self.watermark = watermark
+
+    def high(self):
+        """
+        Highest number received
+        """
+        if (len(self.ends) > 0):
+            return self.ends[-1]
+        return self.watermark
+
+    def gaps(self):
+        """
+        Missing (first, last) ranges between the watermark and the highest number
+        """
+        result = []
+        prev = self.watermark
+        for i in range(len(self.starts)):
+            result.append((prev + 1, self.starts[i] - 1))
+            prev = self.ends[i]
+        return result
+
+class GapTracker(object):
+    """
+    TransRuns per system number
+      maxRuns - runs kept per system, beyond that the oldest gap is given up
+      log     - function(level, fmt, *args), None to print
+    The caller serializes access (ListenerState.lock)
+    """
+    def __init__(self, maxRuns=1000, log=None):
+        self.maxRuns = maxRuns
+        self.log = log or printLog
+        # system -> TransRuns
+        self.systems = {}
+        # systems whose gaps changed since takeDirty()
+        self.dirty = set()
+        # statistics
+        self.repeats = 0
+        self.skipped = 0
+
+    def add(self, system, transNum):
+        """
+        Record a received transaction number
+        Returns the new watermark if it moved, otherwise None
+        """
+        runs = self.systems.get(system)
+        if (runs == None):
+            runs = self.systems[system] = TransRuns()
+        watermark = runs.watermark
+        if (not runs.add(transNum)):
+            self.repeats += 1
+            return None
+        if (len(runs.starts) > self.maxRuns):
+            self.log(WARN, "System %d gives up missing %d-%d", system, *runs.gaps()[0])
+            runs.skipGap()
+            self.skipped += 1
+        self.dirty.add(system)
+        if (runs.watermark != watermark):
+            return runs.watermark
+        return None
+
+    def setWatermark(self, system, watermark):
+        """
+        Take the watermark of a system from the database
+        """
+        runs = self.systems.get(system)
+        if (runs == None):
+            self.systems[system] = TransRuns(watermark)
+        elif (runs.watermark != watermark):
+            runs.moveWatermark(watermark)
+            self.dirty.add(system)
+
+    def restore(self, system, watermark, high, gaps):
+        """
+        Rebuild the runs of a system from its stored watermark, highest
+        number and missing ranges
+        Numbers already received in memory (the database was down at start)
+        are kept, and a higher watermark in memory wins
+        Returns the watermark after the merge
+        """
+        runs = TransRuns(watermark)
+        prev = watermark
+        for first, last in sorted(gaps):
+            if (first <= prev or last < first or last >= high):
+                continue
+            if (first > prev + 1):
+                runs.starts.append(prev + 1)
+                runs.ends.append(first - 1)
+            prev = last
+        if (high > prev):
+            runs.starts.append(prev + 1)
+            runs.ends.append(high)
+        # a gap filled before the watermark was saved
+        if (len(runs.starts) > 0 and runs.starts[0] == watermark + 1):
+            runs.skipGap()
+        current = self.systems.get(system)
+        if (current != None):
+            if (current.watermark > runs.watermark):
+                runs.moveWatermark(current.watermark)
+            for first, last in zip(current.starts, current.ends):
+                runs.addRun(first, last)
+            if (len(current.starts) > 0):
+                self.dirty.add(system)
+        self.systems[system] = runs
+        return runs.watermark
+
+    def watermark(self, system):
+        runs = self.systems.get(system)
+        if (runs == None):
+            return 0
+        return runs.watermark
+
+    def high(self, system):
+        runs = self.systems.get(system)
+        if (runs == None):
+            return 0
+        return runs.high()
+
+    def gaps(self, system):
+        """
+        Missing (first, last) ranges of a system
+        """
+        runs = self.systems.get(system)
+        if (runs == None):
+            return []
+        return runs.gaps()
+
+    def missing(self):
+        """
+        Missing ranges of every system that has any, as {system: gaps}
+        """
+        result = {}
+        for system, runs in self.systems.items():
+            if (len(runs.starts) > 0):
+                result[system] = runs.gaps()
+        return result
+
+    def takeDirty(self, owns=None):
+        """
+        Return and clear the systems changed since the last call
+          owns - function(system) returning True for the systems to take, None for all
+        """
+        if (owns == None):
+            dirty = self.dirty
+            self.dirty = set()
+        else:
+            dirty = set([x for x in self.dirty if owns(x)])
+            self.dirty -= dirty
+        return sorted(dirty)
@@ -0,0 +1,270 @@
+# pts_generator.py
+# Pneumatic Tube System synthetic packet generator
+# Sends 'E', 'S', 'X', 'W', 'w' and 'V' datagrams in the v1.44 layout
+# By MS Technology Solutions LLC
+# For Colombo Pneumatic Tube Systems Inc
+#
+# Packets are packed with the same struct layouts pts_decode.py unpacks, so
+# every generated packet decodes to the fields it was built from.  A
+# TrafficGenerator plans a whole run up front from a seed: which command
+# at which offset for which system, the transaction numbers, the packets
+# that are lost on purpose and the ones sent out of order.  The plan is
+# the same for the same seed, so bench_listener.py knows what to expect
+# without asking the sender.
+#
+# Shapes of the send rate over a run:
+#   steady - evenly spaced at rate packets per second
+#   burst  - burstSize packets back to back, then quiet, averaging rate
+#   ramp   - rising from 0 to twice the rate, averaging rate
+#
+# History:
+# v1.00     17-Oct-2026  Initial Release
+# v1.01     17-Oct-2026  Port option
+version = 'pts_generator.py version 1.01 17-Oct-26'
+#
+# settings
+port = 1236 # listener UDP port
+systems = 4 # systems sending, numbered from firstSystem
+firstSystem = 1
+stations = 10 # stations per system
+rate = 500 # packets per second on average
+seconds = 10 # length of a run
+shape = 'steady' # 'steady', 'burst' or 'ramp'
+burstSize = 100 # packets per burst for the 'burst' shape
+loss = 0.0 # fraction of the packets not sent
+reorder = 0.0 # fraction of the packets sent after a later one
+reorderDepth = 8 # packets a reordered packet moves back at most
+seed = 1 # random seed of the plan
+# relative share of each command in the traffic
+MIX = {'E': 50, 'X': 30, 'W': 5, 'w': 5, 'V': 8, 'S': 2}
+#
+import getopt
+import math
+import random
+import socket
+import sys
+import time
+from pts_decode import HEARTBEAT, TRANSACTION, SECURE_NEW, PARBLOCK
+
+# seconds from the Unix epoch to 01-Jan-1980, the diverter clock origin (see mydt)
+CLOCK_ORIGIN = 315532800
+
+def heartbeatPacket( system, station, msTimer, secTimer ):
+    """
+    'E' heartbeat with 12 status bytes
+    """
+    status = [(station * 16 + i) & 0xff for i in range(12)]
+    return HEARTBEAT.pack(system, 4, ord('E'), station, msTimer, secTimer, *status)
+
+def transactionPacket( command, system, station, msTimer, transNum, start, duration,
+                       source, dest, status, flags ):
+    """
+    'X' transaction or 'V' event
+    """
+    return TRANSACTION.pack(system, 4, ord(command), station, msTimer, transNum, start,
+                            duration, source, dest, status, flags)
+
+def securePacket( command, system, station, msTimer, transNum, scanTime, cardID, status ):
+    """
+    'W' secure removal or 'w' card scan with a 40 bit card ID, device type 4
+    """
+    return SECURE_NEW.pack(system, 4, ord(command), station, msTimer, transNum, scanTime,
+                           (cardID >> 32) & 0xff, (cardID >> 24) & 0xff, (cardID >> 16) & 0xff,
+                           (cardID >> 8) & 0xff, status, cardID & 0xff)
+
+def parBlockPacket( system, msTimer, names, cardLeft=154, cardMin=1000, cardMax=999999999 ):
+    """
+    'S' parameter block with up to 10 station names
+    """
+    names = (list(names) + [''] * 10)[:10]
+    return PARBLOCK.pack(system, 4, ord('S'), 0, msTimer, system, *(names + [cardLeft, cardMin, cardMax]))
+
+class Planned(object):
+    """
+    One packet of a plan
+      offset  - seconds after the start of the run
+      command - command byte
+      system  - system number
+      transNum - transaction number of an 'X', otherwise None
+      status  - status of an 'X' (its eventlog EventType)
+      packet  - the datagram
+      lost    - not sent, on purpose
+    """
+    __slots__ = ('offset', 'command', 'system', 'transNum', 'status', 'packet', 'lost')
+
+    def __init__(self, offset, command, system, transNum, status, packet):
+        self.offset = offset
+        self.command = command
+        self.system = system
+        self.transNum = transNum
+        self.status = status
+        self.packet = packet
+        self.lost = False
+
+class TrafficGenerator(object):
+    """
+    Plans and sends a run of synthetic traffic
+      firstTrans - first transaction number of every system
+    """
+    def __init__(self, systems=4, rate=500, shape='steady', loss=0.0, reorder=0.0, seed=1,
+                 firstSystem=1, stations=10, burstSize=100, reorderDepth=8, firstTrans=1, mix=MIX):
+        self.systems = range(firstSystem, firstSystem + systems)
+        self.rate = rate
+        self.shape = shape
+        self.loss = loss
+        self.reorder = reorder
+        self.seed = seed
+        self.stations = stations
+        self.burstSize = burstSize
+        self.reorderDepth = reorderDepth
+        self.firstTrans = firstTrans
+        self.mix = mix
+
+    def offsets(self, count, seconds):
+        """
+        Send offset of each of count packets
+        """
+        if (self.shape == 'steady'):
+            return [float(i) / self.rate for i in range(count)]
+        if (self.shape == 'burst'):
+            period = float(self.burstSize) / self.rate
+            return [(i // self.burstSize) * period for i in range(count)]
+        if (self.shape == 'ramp'):
+            # rate rises linearly, so i packets are sent by sqrt(i * seconds / rate)
+            return [math.sqrt(float(i) * seconds / self.rate) for i in range(count)]
+        raise ValueError("unknown shape " + str(self.shape))
+
+    def plan(self, seconds, now=None):
+        """
+        Return the Planned packets of a run, in send order
+        """
+        rnd = random.Random(self.seed)
+        if (now == None):
+            now = time.time()
+        clock = int(now) - CLOCK_ORIGIN
+        commands = []
+        for command, weight in sorted(self.mix.items()):
+            commands.extend([command] * weight)
+        count = int(self.rate * seconds)
+        nextTrans = dict([(x, self.firstTrans) for x in self.systems])
+        # transactions of a system waiting for their secure removal
+        waiting = dict([(x, []) for x in self.systems])
+        packets = []
+        # the station names of every system come first
+        for x in self.systems:
+            names = ['SYS%d STN%d' % (x, i) for i in range(1, self.stations + 1)]
+            packets.append(Planned(0, 'S', x, None, None, parBlockPacket(x, 0, names)))
+        for offset in self.offsets(count, seconds):
+            command = rnd.choice(commands)
+            x = rnd.choice(self.systems)
+            station = rnd.randint(1, self.stations)
+            msTimer = int(offset * 1000) & 0xffffffff
+            t = clock + int(offset)
+            transNum = None
+            status = None
+            if (command == 'E'):
+                packet = heartbeatPacket(x, station, msTimer, t)
+            elif (command == 'X'):
+                transNum = nextTrans[x]
+                nextTrans[x] += 1
+                status = 0
+                packet = transactionPacket('X', x, station, msTimer, transNum, t, rnd.randint(5, 120),
+                                           station, rnd.randint(1, self.stations), status, 0)
+                waiting[x].append((transNum, station))
+                del waiting[x][:-100]
+            elif (command == 'W' and len(waiting[x]) > 0):
+                num, station = waiting[x].pop(rnd.randrange(len(waiting[x])))
+                packet = securePacket('W', x, station, msTimer, num, t, 154000000000 + rnd.randint(0, 999999), 1)
+            elif (command == 'V'):
+                packet = transactionPacket('V', x, station, msTimer, 0, t, 0, station, 0, 64, rnd.randint(0, 1))
+            elif (command == 'S'):
+                names = ['SYS%d STN%d' % (x, i) for i in range(1, self.stations + 1)]
+                packet = parBlockPacket(x, msTimer, names)
+            else:
+                # a card scan, or a secure removal without an open transaction
+                command = 'w'
+                packet = securePacket('w', x, station, msTimer, 0, t, 154000000000 + rnd.randint(0, 999999), 1)
+            packets.append(Planned(offset, command, x, transNum, status, packet))
+        # loss and reordering after the numbers are assigned, like on the wire
+        for p in packets:
+            if (rnd.random() < self.loss):
+                p.lost = True
+        for i in range(len(packets) - 1):
+            if (rnd.random() < self.reorder):
+                j = min(len(packets) - 1, i + rnd.randint(1, self.reorderDepth))
+                packets[i].offset, packets[j].offset = packets[j].offset, packets[i].offset
+                packets[i], packets[j] = packets[j], packets[i]
+        return packets
+
+    def send(self, packets, address, start=None):
+        """
+        Send the planned packets to address at their offsets from start
+        Returns (sent, lost, seconds behind schedule at most)
+        """
+        sock = socket.socket(socket.AF_INET, socket.SOCK_DGRAM)
+        if (start == None):
+            start = time.time()
+        sent = lost = 0
+        lag = 0.0
+        try:
+            for p in packets:
+                if (p.lost):
+                    lost += 1
+                    continue
+                delay = start + p.offset - time.time()
+                if (delay > 0.001):
+                    time.sleep(delay)
+                else:
+                    lag = max(lag, -delay)
+                sock.sendto(p.packet, address)
+                sent += 1
+        finally:
+            sock.close()
+        return sent, lost, lag
+
+def usage():
+    print "Usage: pts_generator.py [options] [host]"
+    print "  -s  systems (%d)" % systems
+    print "  -f  first system number (%d)" % firstSystem
+    print "  -r  packets per second (%d)" % rate
+    print "  -d  seconds (%d)" % seconds
+    print "  -b  shape: steady, burst or ramp (%s)" % shape
+    print "  -l  fraction of packets lost (%.2f)" % loss
+    print "  -o  fraction of packets reordered (%.2f)" % reorder
+    print "  -x  random seed (%d)" % seed
+    print "  -t  first transaction number (1)"
+    print "  -a  start time, seconds since the epoch (now)"
+    print "  -p  listener UDP port (%d)" % port
+
+def main(argv):
+
+    print version
+    try:
+        opts, args = getopt.getopt(argv, 'hs:f:r:d:b:l:o:x:t:a:p:')
+    except getopt.GetoptError, e:
+        print e
+        usage()
+        return 2
+    opts = dict(opts)
+    if ('-h' in opts):
+        usage()
+        return 0
+
+    generator = TrafficGenerator(int(opts.get('-s', systems)), float(opts.get('-r', rate)),
+                                 opts.get('-b', shape), float(opts.get('-l', loss)),
+                                 float(opts.get('-o', reorder)), int(opts.get('-x', seed)),
+                                 int(opts.get('-f', firstSystem)), stations, burstSize, reorderDepth,
+                                 int(opts.get('-t', 1)))
+    start = float(opts.get('-a', time.time()))
+    host = '127.0.0.1'
+    if (len(args) > 0):
+        host = args[0]
+    packets = generator.plan(float(opts.get('-d', seconds)), start)
+    sent, lost, lag = generator.send(packets, (host, int(opts.get('-p', port))), start)
+    elapsed = time.time() - start
+    print "%d packets sent in %.1f s (%d packets/s), %d lost on purpose, up to %.3f s behind" % \
+          (sent, elapsed, sent / max(elapsed, 0.001), lost, lag)
+    return 0
+
+if __name__ == "__main__":
+    sys.exit(main(sys.argv[1:]))
@@ -0,0 +1,149 @@
+# pts_heartbeat.py
+# Pneumatic Tube System heartbeat liveness table
+# By MS Technology Solutions LLC
+# For Colombo Pneumatic Tube Systems Inc
+#
+# 'E' heartbeats are the most frequent packet and used to be thrown away.
+# HeartbeatTable keeps the last heartbeat of every (system, station):
+# receive time, MS_TIMER, SEC_TIMER and the 12 status bytes, one dictionary
+# store per packet in the receiver thread.  HeartbeatWriter copies the
+# entries changed since its last run into the heartbeat table every few
+# seconds with one multi-row REPLACE, so a diverter that went quiet shows
+# as an old LastSeen without a database write per heartbeat.
+#
+# History:
+# v1.00     17-Oct-2026  Initial Release
+# v1.01     17-Oct-2026  Statements from pts_sql
+#
+import datetime
+import sys
+import threading
+import time
+from pts_dbpool import isDatabaseDown
+from pts_sql import CREATE_HEARTBEAT, REPLACE_HEARTBEAT, COMMIT
+
+class HeartbeatTable(object):
+    """
+    Last heartbeat per (system, station)
+    """
+    def __init__(self):
+        self.lock = threading.Lock()
+        # (system, station) -> (receive time, decoded heartbeat)
+        self.last = {}
+        # keys changed since the last takeChanged()
+        self.changed = set()
+        # statistics
+        self.heartbeats = 0
+
+    def record(self, hb):
+        """
+        Store a decoded heartbeat
+        hb[0] = system; hb[3] = station; hb[4] = MS_TIMER; hb[5] = SEC_TIMER;
+        hb[6..17] = status bytes
+        """
+        key = (hb[0], hb[3])
+        self.lock.acquire()
+        self.last[key] = (time.time(), hb)
+        self.changed.add(key)
+        self.heartbeats += 1
+        self.lock.release()
+
+    def takeChanged(self):
+        """
+        Return (system, station, receive time, heartbeat) of every entry
+        changed since the last call
+        """
+        self.lock.acquire()
+        try:
+            changed = self.changed
+            self.changed = set()
+            return [key + self.last[key] for key in sorted(changed)]
+        finally:
+            self.lock.release()
+
+    def restoreChanged(self, rows):
+        """
+        Mark entries from takeChanged changed again after a failed write
+        """
+        self.lock.acquire()
+        for row in rows:
+            self.changed.add((row[0], row[1]))
+        self.lock.release()
+
+    def silent(self, maxAge):
+        """
+        (system, station, seconds) of every entry without a heartbeat for maxAge seconds
+        """
+        now = time.time()
+        self.lock.acquire()
+        try:
+            items = self.last.items()
+        finally:
+            self.lock.release()
+        return [(key[0], key[1], now - t) for key, (t, hb) in sorted(items) if now - t >= maxAge]
+
+class HeartbeatWriter(threading.Thread):
+    """
+    Thread writing changed heartbeats to the heartbeat table
+      table    - the HeartbeatTable
+      pool     - ConnectionPool to borrow a connection from
+      interval - seconds between writes
+    """
+    def __init__(self, table, pool, interval=5):
+        threading.Thread.__init__(self, name='heartbeat writer')
+        self.daemon = True
+        self.table = table
+        self.pool = pool
+        self.interval = interval
+        self.stopped = threading.Event()
+        self.created = False
+        # statistics
+        self.writes = 0
+        self.rows = 0
+
+    def run(self):
+        while (not self.stopped.isSet()):
+            self.stopped.wait(self.interval)
+            try:
+                self.write()
+            except:
+                print "\nError writing heartbeats ", sys.exc_info()[0], sys.exc_info()[1]
+
+    def write(self):
+        """
+        Write the entries changed since the last run, kept for later if the
+        database is down
+        """
+        rows = self.table.takeChanged()
+        if (len(rows) == 0):
+            return
+        try:
+            conn = self.pool.borrow()
+        except Exception, e:
+            self.table.restoreChanged(rows)
+            if (not isDatabaseDown(e)):
+                raise
+            return
+        cursor = conn.cursor()
+        try:
+            if (not self.created):
+                cursor.execute(CREATE_HEARTBEAT)
+                self.created = True
+            params = []
+            for system, station, t, hb in rows:
+                params.append((system, station, datetime.datetime.fromtimestamp(t), hb[4], hb[5],
+                               ' '.join(['%02X' % x for x in hb[6:18]])))
+            cursor.executemany(REPLACE_HEARTBEAT, params)
+            cursor.execute(COMMIT)
+            self.writes += 1
+            self.rows += len(rows)
+        except:
+            self.table.restoreChanged(rows)
+            cursor.close()
+            self.pool.closeConnection(conn)
+            raise
+        cursor.close()
+        self.pool.release(conn)
+
+    def stop(self):
+        self.stopped.set()
@@ -0,0 +1,234 @@
+# pts_journal.py
+# Pneumatic Tube System raw packet journal
+# By MS Technology Solutions LLC
+# For Colombo Pneumatic Tube Systems Inc
+#
+# Every received datagram is appended unchanged to a daily binary journal
+# (pts_journal_YYYY-MM-DD.bin) as a length-prefixed frame:
+#   magic 'PJ', payload length, receive time, source address, source port,
+#   followed by the raw payload
+# A sidecar index (pts_journal_YYYY-MM-DD.idx) holds fixed size records
+# that map (system, transaction number) and each minute of receive time to
+# the offset of the frame, so a rebuild can seek straight to the packets
+# it needs instead of re-reading the comma separated pts_N.log files.
+#
+# History:
+# v1.00     17-Oct-2026  Initial Release
+#
+import bisect
+import datetime
+import os
+import socket
+import struct
+import sys
+import threading
+import time
+
+# magic, payload length, receive time, source address, source port
+FRAME = struct.Struct('<2sHd4sH')
+FRAME_MAGIC = 'PJ'
+# kind ('T' transaction, 'B' time bucket), system, transaction number or
+# bucket number, frame offset
+INDEX = struct.Struct('<cBLQ')
+
+def journalFileName( directory, day ):
+    """
+    Journal file of a day, the index has the same name with .idx
+    """
+    return os.path.join(directory, 'pts_journal_' + day.strftime('%Y-%m-%d') + '.bin')
+
+def indexFileName( journal ):
+    """
+    Sidecar index of a journal file
+    """
+    return os.path.splitext(journal)[0] + '.idx'
+
+class JournalWriter(object):
+    """
+    Appends raw datagrams to the journal of the current day
+      directory  - where the journal files go
+      bucket     - seconds per time bucket in the index
+      flushBytes - pending bytes that force a write
+    """
+    def __init__(self, directory, bucket=60, flushBytes=65536):
+        self.directory = directory
+        self.bucket = bucket
+        self.flushBytes = flushBytes
+        self.lock = threading.Lock()
+        self.day = None
+        self.journal = None
+        self.index = None
+        self.offset = 0
+        self.pending = 0
+        self.lastBucket = None
+        # statistics
+        self.frames = 0
+
+    def open(self, day):
+        """
+        Open (or continue) the journal and index of a day, lock must be held
+        """
+        self.closeFiles()
+        filename = journalFileName(self.directory, day)
+        self.journal = open(filename, 'ab', 65536)
+        self.journal.seek(0, 2)
+        self.offset = self.journal.tell()
+        self.index = open(indexFileName(filename), 'ab', 65536)
+        self.day = day
+        self.lastBucket = None
+
+    def append(self, packet, addr, recvTime=None):
+        """
+        Write one datagram, returns its frame offset
+        """
+        if (recvTime == None):
+            recvTime = time.time()
+        self.lock.acquire()
+        try:
+            day = datetime.date.fromtimestamp(recvTime)
+            if (day != self.day):
+                self.open(day)
+            offset = self.offset
+            bucket = int(recvTime) // self.bucket
+            if (bucket != self.lastBucket):
+                self.index.write(INDEX.pack('B', 0, bucket, offset))
+                self.lastBucket = bucket
+            self.journal.write(FRAME.pack(FRAME_MAGIC, len(packet), recvTime,
+                                          socket.inet_aton(addr[0]), addr[1]))
+            self.journal.write(packet)
+            size = FRAME.size + len(packet)
+            self.offset += size
+            self.pending += size
+            self.frames += 1
+            if (self.pending >= self.flushBytes):
+                self.flushFiles()
+            return offset
+        finally:
+            self.lock.release()
+
+    def indexTrans(self, system, transNum, offset):
+        """
+        Record where the packet of a transaction number was written
+        """
+        self.lock.acquire()
+        try:
+            self.index.write(INDEX.pack('T', system, transNum, offset))
+        finally:
+            self.lock.release()
+
+    def flushFiles(self):
+        """
+        Write pending buffers, lock must be held
+        """
+        if (self.journal != None):
+            self.journal.flush()
+            self.index.flush()
+        self.pending = 0
+
+    def flush(self):
+        """
+        Write pending buffers, called from a timer
+        """
+        self.lock.acquire()
+        try:
+            self.flushFiles()
+        finally:
+            self.lock.release()
+
+    def closeFiles(self):
+        """
+        Flush, fsync and close the open files, lock must be held
+        """
+        if (self.journal == None):
+            return
+        self.flushFiles()
+        for f in (self.journal, self.index):
+            try:
+                os.fsync(f.fileno())
+            except OSError:
+                pass
+            f.close()
+        self.journal = None
+        self.index = None
+
+    def close(self):
+        self.lock.acquire()
+        try:
+            self.closeFiles()
+        finally:
+            self.lock.release()
+
+def readFrames( filename, offset=0, end=None ):
+    """
+    Iterate (offset, receive time, (host, port), packet) from a journal
+    Stops at a truncated last frame; skips ahead to the next frame on damage
+    """
+    f = open(filename, 'rb')
+    try:
+        f.seek(offset)
+        data = f.read() if end == None else f.read(end - offset)
+    finally:
+        f.close()
+    pos = 0
+    while (pos + FRAME.size <= len(data)):
+        magic, length, recvTime, addr, port = FRAME.unpack_from(data, pos)
+        if (magic != FRAME_MAGIC):
+            nxt = data.find(FRAME_MAGIC, pos + 1)
+            print "\nJournal damaged at", offset + pos, "skipping", (nxt - pos) if nxt > 0 else "rest"
+            if (nxt < 0):
+                break
+            pos = nxt
+            continue
+        start = pos + FRAME.size
+        if (start + length > len(data)):
+            break
+        yield (offset + pos, recvTime, (socket.inet_ntoa(addr), port), data[start:start + length])
+        pos = start + length
+
+class JournalIndex(object):
+    """
+    Lookups in the sidecar index of one journal file
+    """
+    def __init__(self, journal, bucket=60):
+        self.journal = journal
+        self.bucket = bucket
+        # (system, transaction number) -> [offsets]
+        self.trans = {}
+        # sorted bucket numbers and their first offsets
+        self.bucketKeys = []
+        self.bucketOffsets = []
+        self.load()
+
+    def load(self):
+        try:
+            f = open(indexFileName(self.journal), 'rb')
+            data = f.read()
+            f.close()
+        except IOError:
+            print "\nNo index for", self.journal, sys.exc_info()[1]
+            return
+        buckets = {}
+        for pos in range(0, len(data) - INDEX.size + 1, INDEX.size):
+            kind, system, key, offset = INDEX.unpack_from(data, pos)
+            if (kind == 'T'):
+                self.trans.setdefault((system, key), []).append(offset)
+            elif (kind == 'B'):
+                if (key not in buckets or offset < buckets[key]):
+                    buckets[key] = offset
+        self.bucketKeys = sorted(buckets.keys())
+        self.bucketOffsets = [buckets[k] for k in self.bucketKeys]
+
+    def offsetsForTrans(self, system, transNum):
+        """
+        Frame offsets of a transaction number, [] if not indexed
+        """
+        return self.trans.get((system, transNum), [])
+
+    def offsetForTime(self, t):
+        """
+        Offset to start reading at to see every frame received from time t
+        """
+        i = bisect.bisect_right(self.bucketKeys, int(t) // self.bucket) - 1
+        if (i < 0):
+            return 0
+        return self.bucketOffsets[i]
@@ -0,0 +1,1282 @@
+# pts_listener.py
+# Pneumatic Tube System Data Logger
+# Captures transactions and events of the pneumatic tube system
+# Listens on UDP port 1236 (listenPort) and writes to pts_logger database on localhost
+# By MS Technology Solutions LLC
+# For Colombo Pneumatic Tube Systems Inc
+#
+# History:
+# v1.00     30-Dec-2008  Initial Release
+# v1.01     22-Mar-2009  Add reception of parameter block
+# v1.02     03-May-2009  Open/close connection each time due to 8 hour conn timeout
+# v1.03
+# v1.04     07-Jun-2010  Keep database open for 5 seconds until closing
+# v1.04.01  01-Jan-2014  New requirements for Mainstream 4.  Add log of every valid card scan.
+# v1.04.02  29-Jun-2014  Add station name strings to event log
+# v1.04.03  06-Jul-2014  Need bitwise math to identify station of door open event
+# v1.04.04  14-Jul-2014  Create backward compatability for old mainstream secure card numbers
+# v1.44     02-Dec-2014  Release for WMC
+# v1.45     14-Dec-2014  Fix card ID for older systems with fixed 5th byte (23 hex)
+# v1.46     30-Dec-2014  Implement auto-resync of transaction logs
+# v1.47     14-Sep-2015  Add reload of lastcont parameters before closing database in case of external update
+# v1.48     11-Nov-2015  Protection against old version remote com with new diverter; fix station name update from 99 due to diag data
+# v1.49     17-Oct-2026  Decode packets with precompiled struct layouts (pts_decode.py)
+# v1.49.01  17-Oct-2026  Table driven command dispatch with per handler profiling
+# v1.49.02  17-Oct-2026  Detect v1.44 or v1.5 packet layout per sending system
+# v1.49.03  17-Oct-2026  Batched receive into a preallocated buffer ring (pts_recv.py)
+# v1.49.04  17-Oct-2026  Database writes moved to writer threads behind a bounded queue (pts_pipeline.py)
+# v1.49.05  17-Oct-2026  Batched multi-row eventlog inserts, one commit per batch (pts_sink.py)
+# v1.49.06  17-Oct-2026  Station names from an in-memory cache refreshed by parameter blocks (pts_stations.py)
+# v1.49.07  17-Oct-2026  Pooled persistent db connections with ping on borrow replace the 5 second close (pts_dbpool.py)
+# v1.49.08  17-Oct-2026  Timer driven main loop (pts_timers.py); lastCont saved at least every lastContInterval
+# v1.49.09  17-Oct-2026  Packet logs kept open and buffered, rotated by day or size (pts_logwriter.py)
+# v1.49.10  17-Oct-2026  Raw packet journal with transaction and time index (pts_journal.py)
+# v1.49.11  17-Oct-2026  Write-ahead spool while the database is unreachable (pts_spool.py)
+# v1.49.12  17-Oct-2026  Auto-resync tracks every received transaction number and its gaps (pts_gaps.py)
+# v1.49.13  17-Oct-2026  Per system state for any system number replaces the 21 entry lastCont (pts_systems.py)
+# v1.49.14  17-Oct-2026  lastCont saved with one UPDATE, re-read only when changed externally
+# v1.49.15  17-Oct-2026  Repeated card scans filtered per system, station and card (pts_dedup.py)
+# v1.49.16  17-Oct-2026  Resent transactions recognized in memory, dropped or updated in place
+# v1.49.17  17-Oct-2026  Heartbeats decoded into a liveness table, written to db periodically (pts_heartbeat.py)
+# v1.49.18  17-Oct-2026  All statements from one catalog with driver side parameter binding (pts_sql.py)
+# v1.49.19  17-Oct-2026  Leveled, sampled console output written by its own thread (pts_console.py)
+# v1.49.20  17-Oct-2026  Packet counters and latency histograms on a Prometheus endpoint (pts_metrics.py)
+# v1.49.21  17-Oct-2026  Packet times bound as DATETIME text from a per day cache (pts_clock.py)
+# v1.49.22  17-Oct-2026  'drop' overflow policy discards the oldest queued card scans and events
+# v1.49.23  17-Oct-2026  Each writer saves lastCont and gaps of its own systems only
+# v1.49.24  17-Oct-2026  Any failure to borrow a connection spools the packets
+# v1.49.25  17-Oct-2026  Transactions received before a late state load are merged into the restored gaps
+# v1.49.26  17-Oct-2026  Transaction numbers of rows that failed to write are forgotten by the resend filter
+# v1.49.27  17-Oct-2026  lastCont and gaps saved with one DELETE and one multi-row INSERT
+# v1.49.28  17-Oct-2026  Detected packet layouts reported through the console
+# v1.49.29  17-Oct-2026  No database I/O under the state lock, gap reports from a snapshot
+# v1.49.30  17-Oct-2026  Idle connections reaped by the pool on release, not by the receiver thread
+# v1.49.31  17-Oct-2026  LastContTrans rows updated in place with one CASE UPDATE, external changes win
+# v1.49.32  17-Oct-2026  Parameter blocks written all or nothing, never row by row
+# v1.49.33  17-Oct-2026  A short packet is counted and dropped instead of stopping the listener
+# v1.49.34  17-Oct-2026  Statistics and the listener modules report through the console
+# v1.49.35  17-Oct-2026  UDP port is a setting (listenPort)
+# v1.49.36  17-Oct-2026  Transaction gaps restored for systems without a LastContTrans row
+version = 'pts_listener.py version 1.49.36 17-Oct-26'
+#
+# settings
+listenPort = 1236 # UDP port the diverters send to
+rcvBufSize = 4 * 1024 * 1024 # SO_RCVBUF, capped by net.core.rmem_max on Linux
+recvSlots = 256 # preallocated receive buffers
+recvBatch = 64 # datagrams per recvmmsg call
+dbWriters = 1 # database writer threads, packets of one system always go to the same writer
+queueSize = 10000 # packets per writer queue
+queueOverflow = 'spill' # full queue: 'block', 'spill' to disk or 'drop' the oldest card scans and events
+statsInterval = 60 # seconds between queue and kernel drop reports
+batchRows = 500 # eventlog rows per batch
+batchDelay = 0.2 # seconds before a partial batch is written
+idleFlush = 5 # seconds without packets before lastCont is saved
+lastContInterval = 60 # seconds between lastCont saves under continuous traffic
+logFlushBytes = 65536 # buffered bytes per packet log before it is written
+logFlushInterval = 1 # seconds before buffered packet log lines are written
+logRotate = 'day' # packet log rotation: 'day', 'size' or None
+logMaxBytes = 50 * 1024 * 1024 # packet log size for 'size' rotation
+logBackups = 5 # rotated packet logs kept for 'size' rotation
+journalEnabled = True # keep raw packets in pts_journal_YYYY-MM-DD.bin
+journalSkip = ('E',) # command bytes not journaled, heartbeats would dominate the file
+poolMaxIdle = 3600 # seconds an unused db connection stays open, below MySQL's 8 hour wait_timeout
+spoolSegmentBytes = 16 * 1024 * 1024 # size of one spool segment file
+spoolSync = True # fsync every spooled batch
+spoolRetry = 5 # seconds between database attempts while it is unreachable
+maxGapRuns = 1000 # received runs kept per system above lastCont before the oldest gap is given up
+gapReportMax = 10 # missing ranges per system in the periodic report
+scanWindow = 1 # seconds within which a card scanned again at the same station is ignored
+scanMemory = 16 # seconds a card scan is remembered for the repeat check
+transSpan = 65536 # transaction numbers per system remembered to recognize a resent transaction
+transUpsert = False # resent transaction: True updates the eventlog row, False drops it
+heartbeatInterval = 5 # seconds between writes of the changed heartbeats to the heartbeat table
+heartbeatSilent = 10 # seconds without a heartbeat before a station is reported silent
+consoleLevel = 'info' # 'debug' prints every packet, 'warn' for a quiet production console
+consoleSample = {} # {category: n} prints every nth 'packet', 'sql', 'filter', 'db' or 'stats' line, 0 none
+consoleRate = 200 # debug/info console lines per second, the rest is counted
+consoleQueue = 10000 # console lines waiting to be printed before they are dropped
+metricsPort = 9236 # HTTP port of the Prometheus /metrics endpoint, 0 for none
+metricsHost = '127.0.0.1' # address the metrics endpoint listens on, local only by default
+#
+import socket
+import base64
+import MySQLdb
+import sys
+import datetime
+import errno
+import struct
+#import logging
+#import logging.handlers
+import signal
+import os
+import select
+import threading
+from timeit import default_timer as timer
+from pts_decode import LayoutDetector
+from pts_recv import PacketReceiver, setReceiveBuffer
+from pts_pipeline import PacketQueue, QueueWorker
+from pts_sink import EventBatch
+from pts_stations import StationNames
+from pts_dbpool import ConnectionPool, isConnectionLost
+from pts_timers import Timers
+from pts_logwriter import LogWriters
+from pts_journal import JournalWriter
+from pts_spool import Spool, SpoolDrainer
+from pts_gaps import GapTracker
+from pts_systems import SystemTable
+from pts_dedup import ScanFilter, TransFilter
+from pts_heartbeat import HeartbeatTable, HeartbeatWriter
+from pts_console import Console, LEVELS, DEBUG, INFO, WARN, ERROR
+from pts_metrics import Metrics, MetricsServer
+from pts_clock import PtsClock
+from pts_sql import INSERT_TRANSACTION, UPDATE_TRANSACTION, UPDATE_SECURE_REM, INSERT_CARD_EVENT, \
+     INSERT_CARD_SCAN_V15, DELETE_STATIONS, INSERT_STATION, SELECT_LAST_CONT, \
+     SELECT_LAST_CONT_FINGERPRINT, SELECT_HIGH_TRANS, SELECT_RECENT_TRANS, SELECT_TRANS_GAPS, \
+     INSERT_PARAMETER, COMMIT, ROLLBACK, updateLastContRows, deleteTransGaps
+
+# console output of every thread, written by the console thread once main() starts it
+console = Console(LEVELS[consoleLevel], consoleSample, consoleRate, consoleQueue)
+
+# SEC_TIMER to DATETIME conversion, days cached
+clock = PtsClock()
+
+# per packet metrics, served by a MetricsServer once main() starts it
+metrics = Metrics()
+PACKETS = metrics.counter('pts_packets_total', 'Packets received per command byte and system',
+                          ('command', 'system'))
+RECEIVE_SECONDS = metrics.histogram('pts_receive_seconds', 'Decode and filter time per packet',
+                                    ('command',))
+ENRICH_SECONDS = metrics.histogram('pts_enrich_seconds', 'Station name lookup time per packet',
+                                   ('command',))
+WRITE_SECONDS = metrics.histogram('pts_write_seconds', 'Writer thread time per packet', ('command',))
+COMMIT_SECONDS = metrics.histogram('pts_db_commit_seconds', 'Time to write and commit one batch',
+                                   ('writer',))
+FILTERED = metrics.counter('pts_filtered_total', 'Packets dropped or rewritten by a filter', ('reason',))
+DB_ERRORS = metrics.counter('pts_db_errors_total', 'Failed database operations', ('operation',))
+
+def signal_handler(signal, frame):
+        # print 'You pressed Ctrl+C!'
+        sys.exit(0)
+
+def ByteToHex( byteStr ):
+    """
+    Convert a byte string to it's hex string representation e.g. for output.
+    """
+    
+    # Uses list comprehension which is a fractionally faster implementation than
+    # the alternative, more readable, implementation below
+    #   
+    #    hex = []
+    #    for aChar in byteStr:
+    #        hex.append( "%02X " % ord( aChar ) )
+    #
+    #    return ''.join( hex ).strip()        
+
+    return ''.join( [ "%02X " % ord( x ) for x in byteStr ] ).strip()
+
+def StrToBytes( byteStr ):
+	"""
+	Convert a string of byte data into a byte array
+	"""
+	byteAry = []
+	#byteAry.append(x) 
+	for x in byteStr:
+		byteAry.append(ord(x))
+		
+	return byteAry
+	
+def StrToInt ( byteStr ):
+	"""
+	Convert a string of byte data into an 2 byte integer
+	"""
+	return ord(byteStr[0]) + (ord(byteStr[1])*256)
+	
+def StrToLong ( byteStr ):
+	"""
+	Convert a string of byte data into a 4 byte integer
+	"""
+	return ord(byteStr[0]) + (ord(byteStr[1])<<8) + (ord(byteStr[2])<<16) + (ord(byteStr[3])<<24)
+
+def StrToString ( byteStr ):
+        """
+        Convert a string of byte data into a proper length string
+        Take data up to the embedded null
+        """
+        return byteStr.split("\0")[0]
+	
+def mydt( d ):
+    """
+    Calculate date based on supplied base of 1980-1-1 and d in seconds
+    """
+    return clock.datetime(d)
+
+def getTransStationNames(dataAry, stations, dbcursor):
+    """
+    Get both transaction station names from the station name cache
+    """
+    if (dataAry[8] == 0):
+        dataAry.append(stations.get(dataAry[0], dataAry[8], dbcursor))
+        dataAry.append(stations.get(dataAry[0], dataAry[9], dbcursor))
+    else:
+        dataAry.append(stations.get(dataAry[0], dataAry[9], dbcursor))
+        dataAry.append(stations.get(dataAry[0], dataAry[8], dbcursor))
+
+    return
+
+def getEventStationNames(dataAry, stations, dbcursor):
+    """
+    Get one or both event station names from the station name cache
+    """
+    if (dataAry[10] == 64 ):
+        if ((dataAry[11] & 1) == 1): # main door (status 64)
+            console.log(DEBUG, 'packet', "ev64-1 ")
+            dataAry.append(stations.get(dataAry[0], dataAry[8], dbcursor))
+            dataAry.append("")
+        else: # remote door (status 64)
+            console.log(DEBUG, 'packet', "ev64-2 ")
+            dataAry.append("")
+            dataAry.append(stations.get(dataAry[0], dataAry[8], dbcursor))
+    else:
+        console.log(DEBUG, 'packet', "ev?-?  %s %s", dataAry[10], dataAry[11])
+        dataAry.append("")
+        dataAry.append("")
+
+    return
+def insertTransactionIntoDb( dataAry, dbbatch ):
+    """
+    Insert transaction data array into the pts_datalog database
+    """
+    row = (dataAry[5], dataAry[0], dataAry[10], clock.text(dataAry[6]), dataAry[7],
+           dataAry[8], dataAry[9], dataAry[10], dataAry[11], dataAry[12], dataAry[13])
+    console.log(DEBUG, 'sql', "eventlog %s", row)
+    dbbatch.add(INSERT_TRANSACTION, row)
+
+    return
+
+def updateTransactionInDb( dataAry, dbbatch ):
+    """
+    Replace the eventlog row of a resent transaction with its corrected data
+    """
+    dbbatch.add(UPDATE_TRANSACTION,
+                (clock.text(dataAry[6]), dataAry[7], dataAry[8], dataAry[9], dataAry[11],
+                 dataAry[12], dataAry[13], dataAry[0], dataAry[5], dataAry[10]))
+
+    return
+
+def updateSecureRemIntoDb( dataAry, dbbatch ):
+    """
+    Update transaction record with CardID in the pts_datalog database
+    """
+    scanTime = clock.text(dataAry[6])
+    dbbatch.add(UPDATE_SECURE_REM,
+                (dataAry[7], scanTime, dataAry[0], dataAry[5]))
+    # also insert as an event, ID stored into Flags
+    dbbatch.add(INSERT_CARD_EVENT,
+                (dataAry[5], dataAry[0], dataAry[8], scanTime,
+                 dataAry[3], dataAry[8], dataAry[7], dataAry[7], dataAry[10]))
+
+    return
+
+def insertCardScanIntoDb( dataAry, dbbatch ):
+    """
+    Update transaction record with CardID in the pts_datalog database
+    """
+    # insert as an event, ID stored into Flags
+    dbbatch.add(INSERT_CARD_EVENT,
+                (dataAry[5], dataAry[0], dataAry[8], clock.text(dataAry[6]),
+                 dataAry[3], dataAry[8], dataAry[7], dataAry[7], dataAry[10]))
+
+    return
+
+def insertCardScanV15IntoDb( dataAry, dbbatch ):
+    """
+    Add record with CardID of a Mainstream v500 card scan in the pts_datalog database
+    """
+    # insert as an event, site number stored into Flags
+    scanTime = clock.text(dataAry[11])
+    dbbatch.add(INSERT_CARD_SCAN_V15,
+                (dataAry[0], dataAry[3], scanTime, 0,
+                 dataAry[4], 0, 0, dataAry[8], dataAry[7], scanTime))
+
+    return
+
+def insertParBlockIntoDb( dataAry, dbbatch ):
+    """
+    Insert the parameter block data into the database
+    """
+    # write queued events first, the parameter block commits on its own
+    dbbatch.flush()
+    # delete any existing parameter sets for this system
+    dbbatch.add(DELETE_STATIONS, (dataAry[0],))
+    # insert the new parameter sets for this system
+    for i in range(10):
+        dbbatch.add(INSERT_STATION, (dataAry[0], i, dataAry[6+i]))
+    # one transaction to ensure completeness, or the spool while the db is down
+    dbbatch.flush(atomic=True)
+
+    return
+
+def logFileName( lognum ):
+    """
+    Name of the log file of a system number
+    """
+    if (os.name=="nt"):
+        return 'pts_' + str(lognum) + '.log'
+    return '/var/log/pts_' + str(lognum) + '.log'
+
+def readLastCont(dbcursor):
+    """
+    Read the (system, LastContTrans) rows, None if the query failed
+    No lock may be held, the caller applies them with SystemTable.load
+    """
+    try:
+        dbcursor.execute(SELECT_LAST_CONT)
+        return dbcursor.fetchall()
+            
+    except:
+        console.log(ERROR, 'db', "Error reading parameters from db  %s", sys.exc_info()[0])
+        DB_ERRORS.inc(('lastcont_read',))
+        
+    return None
+    
+def takeResync(systems, gaps, owns=None):
+    """
+    Copy the values to save: (dirty systems, systems whose gaps changed,
+    their TransHigh and TransGap<system> rows)
+    state.lock must be held, see resyncWritten for the outcome
+    owns limits the save to the systems of one writer
+    """
+    dirty = systems.takeDirty(owns)
+    gapSystems = gaps.takeDirty(owns)
+    gapRows = []
+    for x in gapSystems:
+        gapRows.append(('TransHigh', x, gaps.high(x)))
+        for first, last in gaps.gaps(x):
+            gapRows.append(('TransGap' + str(x), first, last))
+    return dirty, gapSystems, gapRows
+
+def writeResyncIntoDb(dirty, gapSystems, gapRows, dbcursor):
+    """
+    Save the auto-resync values in one transaction: the existing
+    LastContTrans rows of the touched systems with one CASE UPDATE, a row
+    for each system that has none yet, and the TransHigh and
+    TransGap<system> rows of the systems whose gaps changed
+    Returns (written, systems whose row was changed by someone else and
+    kept its value), runs without the state lock
+    """
+    if (len(dirty) == 0 and len(gapSystems) == 0):
+        return True, []
+    try:
+        conflicts = []
+        # a row only changes while it holds what was saved last
+        updates = [(x, watermark, saved) for x, watermark, stored, saved in dirty
+                   if stored and watermark != saved]
+        if (len(updates) > 0):
+            params = []
+            for x, watermark, saved in updates:
+                params.extend((x, watermark))
+            params.extend([x for x, watermark, saved in updates])
+            for x, watermark, saved in updates:
+                params.extend((x, saved))
+            dbcursor.execute(updateLastContRows(len(updates)), tuple(params))
+            if (dbcursor.rowcount != len(updates)):
+                conflicts = [x for x, watermark, saved in updates]
+        if (len(gapSystems) > 0):
+            names = ['TransGap' + str(x) for x in gapSystems]
+            dbcursor.execute(deleteTransGaps(len(gapSystems)), tuple(names + gapSystems))
+        rows = [('LastContTrans', x, watermark) for x, watermark, stored, saved in dirty if not stored]
+        if (len(rows + gapRows) > 0):
+            dbcursor.executemany(INSERT_PARAMETER, rows + gapRows)
+        dbcursor.execute(COMMIT)
+        for x, watermark, stored, saved in dirty:
+            console.log(INFO, 'db', " System %d  updated to %d", x, watermark)
+        return True, conflicts
+            
+    except:
+        console.log(ERROR, 'db', "Error updating parameters to db  %s", sys.exc_info()[0])
+        DB_ERRORS.inc(('lastcont_write',))
+        try:
+            dbcursor.execute(ROLLBACK)
+        except:
+            pass
+        
+    return False, []
+
+def resyncWritten(systems, gaps, dirty, gapSystems, written):
+    """
+    Take the outcome of writeResyncIntoDb, state.lock must be held
+    """
+    if (written):
+        for x, watermark, stored, saved in dirty:
+            systems.get(x).stored = True
+            systems.get(x).saved = watermark
+    else:
+        # try again next time
+        systems.restoreDirty(dirty)
+        gaps.dirty.update(gapSystems)
+
+def readLastContFingerprint(dbcursor):
+    """
+    Fingerprint of the LastContTrans rows to compare with
+    SystemTable.fingerprint(), None if the check failed
+    """
+    try:
+        dbcursor.execute(SELECT_LAST_CONT_FINGERPRINT)
+        row = dbcursor.fetchone()
+        return tuple([int(x or 0) for x in row])
+
+    except:
+        console.log(ERROR, 'db', "Error checking parameters in db  %s", sys.exc_info()[0])
+        DB_ERRORS.inc(('lastcont_check',))
+
+    return None
+
+def seedTransFilter(trans, dbcursor):
+    """
+    Record the most recent transaction numbers of every system in eventlog
+    """
+    try:
+        dbcursor.execute(SELECT_HIGH_TRANS)
+        for system, high in dbcursor.fetchall():
+            dbcursor.execute(SELECT_RECENT_TRANS, (system, high - trans.span))
+            for transNum, eventType in dbcursor.fetchall():
+                trans.seen((int(system), int(eventType)), int(transNum))
+        # not part of the duplicate counts
+        trans.checked = trans.duplicates = trans.tooOld = 0
+
+    except:
+        console.log(ERROR, 'db', "Error reading recent transactions from db  %s", sys.exc_info()[0])
+        DB_ERRORS.inc(('recent_trans',))
+
+    return
+
+def readTransGaps(dbcursor):
+    """
+    Read the TransHigh and TransGap<system> parameters as
+    ({system: high}, {system: [(first, last)]}), empty if the query failed
+    """
+    highs = {}
+    missing = {}
+    try:
+        dbcursor.execute(SELECT_TRANS_GAPS)
+        for name, val1, val2 in dbcursor.fetchall():
+            if (name == 'TransHigh'):
+                highs[int(val1)] = int(val2)
+            else:
+                missing.setdefault(int(name[8:]), []).append((int(val1), int(val2)))
+
+    except:
+        console.log(ERROR, 'db', "Error reading transaction gaps from db  %s", sys.exc_info()[0])
+        DB_ERRORS.inc(('gaps_read',))
+
+    return highs, missing
+
+def restoreTransGaps(gaps, systems, highs, missing):
+    """
+    Rebuild the received transaction numbers above lastCont from what
+    readTransGaps returned, state.lock must be held
+    Every system with a LastContTrans row, gap rows or numbers received
+    in memory is restored, also one without a LastContTrans row yet
+    """
+    numbers = set(highs.keys()) | set(missing.keys()) | set(gaps.systems.keys())
+    numbers.update([x for x, entry in systems.items()])
+    for x in sorted(numbers):
+        stored = systems.watermark(x)
+        # merged with what was received before a late load
+        watermark = gaps.restore(x, stored, highs.get(x, stored), missing.get(x, []))
+        if (watermark != stored):
+            systems.setWatermark(x, watermark)
+
+def connectDb():
+        """
+        Opens a database connection
+        """
+        # setup and open a connection to the database
+        try:
+                if (os.name=="nt"):
+                        mdb = MySQLdb.connect(host="localhost", user="pts_logger", passwd="colombopts", db="pts_datalog")
+                else:
+                        mdb = MySQLdb.connect(host="localhost", user="pts_logger", passwd="colombopts", db="pts_datalog",
+                                 unix_socket="/opt/lampp/var/mysql/mysql.sock")
+                #print "Db connection opened"
+                
+        except:
+                console.log(ERROR, 'db', "Error opening database connection:  %s", sys.exc_info()[0])
+                DB_ERRORS.inc(('connect',))
+                raise
+        
+        return mdb
+
+
+class ListenerState(object):
+    """
+    Per process state shared by the receiver and the writer threads
+    """
+    def __init__(self):
+        # define and initialize array for last continuous transaction
+        # lastCont and lastTouched of every system, created on first use
+        self.systems = SystemTable()
+        # received transaction numbers above lastCont and the gaps between them
+        self.gaps = GapTracker(maxGapRuns, console.logger('gaps'))
+        # guards the system table and gaps between writer threads, never
+        # held for database I/O and never taken by the receiver thread
+        self.lock = threading.Lock()
+        # missing ranges per system as of the last load or save, for reports
+        self.missing = {}
+        # station names, preloaded and refreshed by parameter blocks
+        self.stations = StationNames(console.logger('db'))
+        # open packet log files
+        self.logs = LogWriters(logFileName, logFlushBytes, logRotate, logMaxBytes, logBackups)
+        # setup to block repeated card scans, receiver thread only
+        self.scans = ScanFilter(scanWindow, scanMemory)
+        # recent transaction numbers, writer threads
+        self.trans = TransFilter(transSpan)
+        # last heartbeat per system and station
+        self.heartbeats = HeartbeatTable()
+        # lastCont and station names read from the database
+        self.loaded = False
+
+    def load(self, dbcursor):
+        """
+        Read the auto-resync values and station names
+        """
+        console.log(INFO, 'db', "Loading Auto-Resync Value")
+        rows = readLastCont(dbcursor)
+        highs, missing = readTransGaps(dbcursor)
+        # the queries are done, the lock only covers the memory update
+        self.lock.acquire()
+        try:
+            if (rows != None):
+                self.systems.load(rows)
+            restoreTransGaps(self.gaps, self.systems, highs, missing)
+            self.missing = self.gaps.missing()
+        finally:
+            self.lock.release()
+        console.log(INFO, 'db', "Loading Recent Transactions")
+        seedTransFilter(self.trans, dbcursor)
+        console.log(INFO, 'db', "Loading Station Names")
+        self.stations.load(dbcursor)
+        self.loaded = True
+
+class DbSession(object):
+    """
+    Database work of one writer thread
+    A pooled connection is borrowed with the first packet of a burst and
+    given back, after saving lastCont, once idleFlush seconds pass quietly.
+    Under continuous traffic lastCont is saved every lastContInterval.
+    While the database is unreachable, or the spool still holds batches,
+    the session works without a connection and its batches are spooled.
+    A session only saves the lastCont and gaps of its own systems
+    (system % dbWriters == index): another writer's may have moved over
+    rows that are still in that writer's batch.
+    """
+    def __init__(self, name, state, pool, spool, index=0):
+        self.name = name
+        self.index = index
+        self.state = state
+        self.pool = pool
+        self.conn = None
+        self.cursor = None
+        self.idleTime = datetime.datetime.now()
+        self.idleDelta = datetime.timedelta(seconds=idleFlush)
+        self.saveTime = datetime.datetime.now()
+        self.saveDelta = datetime.timedelta(seconds=lastContInterval)
+        # eventlog rows waiting to be written
+        self.batch = EventBatch(batchRows, batchDelay)
+        self.batch.reconnect = self.reconnect
+        self.batch.spool = spool
+        self.batch.timing = self.commitTiming
+        self.batch.failed = self.rowFailed
+        self.batch.log = console.logger('db')
+        # no connection attempt before this time
+        self.retryTime = datetime.datetime.now()
+        self.retryDelta = datetime.timedelta(seconds=spoolRetry)
+
+    def openCursor(self):
+        """
+        Borrow a connection if needed and stay active for another idleFlush
+        Returns None while working without a connection
+        """
+        now = datetime.datetime.now()
+        # the spool drainer tells when the database is back
+        if (self.conn == None and now >= self.retryTime and self.batch.spool.pending() == 0):
+            try:
+                self.conn = self.pool.borrow()
+            except Exception, e:
+                # not only 'down' errors: too many connections (1040), access
+                # denied (1045), shutdown in progress (1053) would lose the packet
+                console.log(WARN, 'db', "Database unreachable, spooling %s  %s", self.name, e)
+                self.retryTime = now + self.retryDelta
+            else:
+                self.cursor = self.conn.cursor()
+                self.batch.cursor = self.cursor
+                self.saveTime = now + self.saveDelta
+                if (not self.state.loaded):
+                    self.state.load(self.cursor)
+        self.idleTime = now + self.idleDelta
+        return self.cursor
+
+    def reconnect(self, err):
+        """
+        Replace a lost connection, returns the new cursor or None
+        """
+        if (self.conn == None or not isConnectionLost(err)):
+            return None
+        try:
+            self.conn = self.pool.replace(self.conn)
+        except:
+            # carry on without a connection
+            self.conn = None
+            self.cursor = None
+            self.batch.cursor = None
+            self.retryTime = datetime.datetime.now() + self.retryDelta
+            raise
+        self.cursor = self.conn.cursor()
+        self.batch.cursor = self.cursor
+        return self.cursor
+
+    def write(self, item):
+        """
+        Run a queued (command, dataAry) through its handler
+        """
+        command, dataAry = item
+        handler = HANDLERS[command]
+        t0 = timer()
+        handler.write(dataAry, self, self.state)
+        elapsed = timer() - t0
+        handler.writeSeconds += elapsed
+        WRITE_SECONDS.observe((command,), elapsed)
+
+    def commitTiming(self, seconds, rows):
+        """
+        Called by the batch after each commit
+        """
+        COMMIT_SECONDS.observe((self.name,), seconds)
+
+    def rowFailed(self, sql, row):
+        """
+        Called by the batch for a row it could not write
+        """
+        if (sql == INSERT_TRANSACTION):
+            # (TransNum, System, EventType, ...), a resend must not be dropped
+            self.state.trans.forget((row[1], row[2]), row[0])
+
+    def idle(self):
+        """
+        Write a due batch, save lastCont when due and give the connection
+        back once idleFlush has passed without a packet
+        Returns the seconds until the next check, None while idle
+        """
+        if (self.batch.due() == 0):
+            self.batch.flush()
+        if (self.conn == None):
+            return self.batch.due()
+        now = datetime.datetime.now()
+        if (now >= self.idleTime):
+            self.close()
+            return None
+        if (now >= self.saveTime):
+            self.batch.flush()
+            self.saveLastCont()
+        remaining = min(self.idleTime, self.saveTime) - now
+        remaining = remaining.seconds + remaining.microseconds / 1e6
+        due = self.batch.due()
+        if (due != None and due < remaining):
+            return due
+        return remaining
+
+    def saveLastCont(self):
+        """
+        Write the auto-resync values and pick up external changes
+        """
+        if (self.cursor == None):
+            # lost while writing the batch, the values stay dirty
+            return
+        state = self.state
+        # the state lock is only held between the queries, a slow database
+        # must not stall the other writers
+        # re-read latest lastcont in case of an external re-sync, compared
+        # with the values saved last so it can come before the write
+        fingerprint = readLastContFingerprint(self.cursor)
+        state.lock.acquire()
+        changed = (fingerprint == None or fingerprint != state.systems.fingerprint())
+        state.lock.release()
+        if (changed):
+            console.log(INFO, 'db', "LastContTrans changed externally, reloading")
+            self.reloadLastCont()
+        state.lock.acquire()
+        try:
+            dirty, gapSystems, gapRows = takeResync(state.systems, state.gaps, self.owns)
+        finally:
+            state.lock.release()
+        written, conflicts = writeResyncIntoDb(dirty, gapSystems, gapRows, self.cursor)
+        state.lock.acquire()
+        try:
+            resyncWritten(state.systems, state.gaps, dirty, gapSystems, written)
+            state.missing = state.gaps.missing()
+        finally:
+            state.lock.release()
+        if (len(conflicts) > 0):
+            # changed after the fingerprint check, the external value wins
+            console.log(INFO, 'db', "LastContTrans changed externally while saving, reloading")
+            self.reloadLastCont(conflicts)
+        self.saveTime = datetime.datetime.now() + self.saveDelta
+
+    def reloadLastCont(self, prefer=()):
+        """
+        Re-read the LastContTrans rows, the systems in prefer take the
+        database value even if they have an unsaved one
+        """
+        rows = readLastCont(self.cursor)
+        if (rows == None):
+            return
+        state = self.state
+        state.lock.acquire()
+        try:
+            state.systems.load(rows, prefer)
+            for x, entry in state.systems.items():
+                state.gaps.setWatermark(x, entry.watermark)
+        finally:
+            state.lock.release()
+
+    def owns(self, system):
+        """
+        True for the systems whose packets this session writes
+        """
+        return (system % dbWriters == self.index)
+
+    def close(self):
+        """
+        Save the auto-resync values and return the connection to the pool
+        """
+        self.batch.flush()
+        if (self.conn == None):
+            return
+        self.saveLastCont()
+        self.cursor.close()
+        self.batch.cursor = None
+        self.pool.release(self.conn)
+        self.conn = None
+        console.log(INFO, 'db', "Db Idle %s", self.name)
+
+class PacketHandler(object):
+    """
+    Describes how one command byte is processed
+      tag     - console prefix of the 'packet' output, None for none
+      decode  - False to only count the packet, the decoder itself comes from the
+                layout detected for the sender (see pts_decode.py)
+      accept  - function(dataAry, state) returning False to drop the packet
+      enrich  - function(dataAry, stations, dbcursor) appending station names
+      sinks   - list of function(dataAry, dbbatch) writing to the database
+      update  - function(dataAry, state) run after the sinks
+      duplicate - function(dataAry, state) returning True for a packet that
+                  was written before
+      resends - sinks used instead for a duplicate, None to drop it
+      fmt     - console format of each field
+      droppable - may be discarded, oldest first, when a writer queue with the
+                  'drop' policy is full; only packets whose row can be
+                  replayed from the log and journal without touching another row
+    decode and accept run in the receiver thread, the rest
+    in the database writer thread of the packet's system
+    """
+    def __init__(self, tag, decode=True, accept=None, enrich=None, sinks=(), update=None, fmt="%d ",
+                 droppable=False, duplicate=None, resends=None):
+        self.tag = tag
+        self.decode = decode
+        self.accept = accept
+        self.enrich = enrich
+        self.sinks = sinks
+        self.update = update
+        self.fmt = fmt
+        self.droppable = droppable
+        self.duplicate = duplicate
+        self.resends = resends
+        # set by registerHandler
+        self.command = None
+        # profiling
+        self.count = 0
+        self.seconds = 0.0
+        self.writeSeconds = 0.0
+
+    def receive(self, mypack, decoder, state):
+        """
+        Decode and filter one packet, returns the data array to queue or None
+        """
+        if (self.decode == False):
+            if (self.tag != None):
+                console.log(DEBUG, 'packet', self.tag)
+            return None
+        dataAry = decoder(mypack)
+        if (self.accept != None and not self.accept(dataAry, state)):
+            return None
+        # formatted by the console thread, from a copy the enrich step cannot change
+        if (self.tag != None and console.enabled(DEBUG)):
+            console.log(DEBUG, 'packet', formatPacket, self.tag, self.fmt, tuple(dataAry))
+        return dataAry
+
+    def write(self, dataAry, session, state):
+        """
+        Run one decoded packet through log, enrich and sinks
+        """
+        # uses dataAry[0] SystemNumber as part of the log file name
+        state.logs.write(dataAry[0], dataAry)
+        state.systems.seen(dataAry[0])
+        sinks = self.sinks
+        if (self.duplicate != None and self.duplicate(dataAry, state)):
+            FILTERED.inc(('resent',))
+            if (self.resends == None):
+                console.log(DEBUG, 'filter', "Ignore resent %s %s", dataAry[0], dataAry[5])
+                # it still fills its gap for the auto-resync
+                if (self.update != None):
+                    self.update(dataAry, state)
+                return
+            sinks = self.resends
+        cursor = session.openCursor()
+        if (self.enrich != None):
+            t0 = timer()
+            self.enrich(dataAry, state.stations, cursor)
+            ENRICH_SECONDS.observe((self.command,), timer() - t0)
+        for sink in sinks:
+            sink(dataAry, session.batch)
+        if (self.update != None):
+            self.update(dataAry, state)
+
+def formatPacket(tag, fmt, dataAry):
+    """
+    Console line of a decoded packet
+    """
+    return tag + ' ' + ' '.join([fmt % a for a in dataAry])
+
+def acceptSecureRemoval(sr, state):
+    """
+    Drop diagnostic secure removals from system 9
+    """
+    if ( (sr[0]==9) and (sr[7] <= 1000) ):
+        console.log(DEBUG, 'filter', "Ignore sys 9 ")
+        FILTERED.inc(('sys9_diag',))
+        return False
+    return True
+
+def acceptCardScan(sr, state):
+    """
+    Drop a repeated scan of the same card at the same station
+    sr[0] = system; sr[3] = station; sr[6] = time; sr[7] = card ID
+    """
+    if (state.scans.repeat((sr[0], sr[3], sr[7]), sr[6])):
+        console.log(DEBUG, 'filter', "Ignore repeat scan")
+        FILTERED.inc(('repeat_scan',))
+        return False
+    return True
+
+def acceptHeartbeat(hb, state):
+    """
+    Keep the heartbeat in the liveness table, it is never queued
+    """
+    state.heartbeats.record(hb)
+    return False
+
+def acceptEvent(ev, state):
+    """
+    Drop events with a corrupt transaction number
+    """
+    if (ev[5]<1000000000):
+        return True
+    console.log(WARN, 'filter', "dropped bad data")
+    FILTERED.inc(('bad_data',))
+    return False
+
+def getRemStationName(sr, stations, dbcursor):
+    """
+    Append the station name of a secure removal or card scan
+    """
+    sr.append(stations.get(sr[0], sr[3], dbcursor))
+
+def isResentTransaction(tr, state):
+    """
+    True if the transaction number and status of a system were seen before
+    tr[0] = system number; tr[5] = transaction number; tr[10] = status
+    """
+    return state.trans.seen((tr[0], tr[10]), tr[5])
+
+def refreshStationNames(pb, state):
+    """
+    Take the new station names of a parameter block into the cache
+    """
+    state.stations.update(pb)
+
+def updateLastCont(tr, state):
+    """
+    Update the lastContTrans parameter when the transaction closes a gap
+    tr[0] = system number; tr[5] = transaction number
+    """
+    state.lock.acquire()
+    watermark = state.gaps.add(tr[0], tr[5])
+    if (watermark != None):
+        state.systems.setWatermark(tr[0], watermark) # new lastContTrans #, touched
+    state.lock.release()
+
+# handler registry keyed by command byte
+HANDLERS = {}
+
+def registerHandler(command, handler):
+    """
+    Add or replace the handler of a command byte
+    """
+    handler.command = command
+    HANDLERS[command] = handler
+
+# heartbeat message, reported through the heartbeat table
+registerHandler('E', PacketHandler(None, accept=acceptHeartbeat))
+# parameter block
+registerHandler('S', PacketHandler("PB ", sinks=[insertParBlockIntoDb], update=refreshStationNames, fmt="%s"))
+# transaction message
+registerHandler('X', PacketHandler("TX ", enrich=getTransStationNames,
+                                   sinks=[insertTransactionIntoDb], update=updateLastCont,
+                                   duplicate=isResentTransaction,
+                                   resends=[updateTransactionInDb] if transUpsert else None))
+# secure removal message
+registerHandler('W', PacketHandler("SR ", accept=acceptSecureRemoval,
+                                   enrich=getRemStationName, sinks=[updateSecureRemIntoDb]))
+# standard card scan
+registerHandler('w', PacketHandler("SC ", accept=acceptCardScan,
+                                   enrich=getRemStationName, sinks=[insertCardScanIntoDb], droppable=True))
+# event message
+registerHandler('V', PacketHandler("EV ", accept=acceptEvent,
+                                   enrich=getEventStationNames, sinks=[insertTransactionIntoDb], droppable=True))
+# Mainstream v500 card scan
+registerHandler('K', PacketHandler("CS ", sinks=[insertCardScanV15IntoDb], droppable=True))
+
+def printHandlerStats():
+    """
+    Report packet count and average processing time per command byte
+    """
+    for command in sorted(HANDLERS.keys()):
+        handler = HANDLERS[command]
+        if (handler.count > 0):
+            console.log(INFO, 'stats', " %s %8d packets %8.1f us/packet receive %8.1f us/packet write",
+                        command, handler.count, handler.seconds * 1e6 / handler.count,
+                        handler.writeSeconds * 1e6 / handler.count)
+
+def printQueueStats(queues):
+    """
+    Report depth and overflow counters of the writer queues
+    """
+    for i in range(len(queues)):
+        st = queues[i].stats()
+        console.log(INFO, 'stats', " queue %d depth %d max %d puts %d dropped %d spilled %d blocked %d",
+                    i, st['depth'], st['maxDepth'], st['puts'], st['dropped'], st['spilled'], st['blocked'])
+
+def printPoolStats(pool):
+    """
+    Report connection pool counters
+    """
+    st = pool.stats()
+    console.log(INFO, 'stats', " db pool opened %d reconnects %d expired %d borrows %d idle %d",
+                st['opened'], st['reconnects'], st['expired'], st['borrows'], st['idle'])
+
+def printSpoolStats(spool):
+    """
+    Report write-ahead spool counters
+    """
+    st = spool.stats()
+    console.log(INFO, 'stats', " spool pending %d appended %d drained %d segments %d",
+                st['pending'], st['appended'], st['drained'], st['segments'])
+
+def printGapStats(state):
+    """
+    Report the missing transaction numbers of every system
+    """
+    if (not console.enabled(INFO)):
+        return
+    # as of the last save, the receiver thread does not take the state lock
+    missing = state.missing
+    for system in sorted(missing.keys()):
+        gaps = missing[system]
+        console.log(INFO, 'stats', " system %d lastCont %d missing %s%s",
+                    system, state.systems.watermark(system),
+                    ' '.join(['%d-%d' % g for g in gaps[:gapReportMax]]),
+                    (' and %d more' % (len(gaps) - gapReportMax)) if len(gaps) > gapReportMax else '')
+
+def printScanStats(scans):
+    """
+    Report repeated card scan counters
+    """
+    st = scans.stats()
+    console.log(INFO, 'stats', " card scans %d repeats %d (%.1f%%) tracked %d expired %d",
+                st['scans'], st['repeats'], st['repeats'] * 100.0 / max(st['scans'], 1),
+                st['tracked'], st['expired'])
+
+def printTransStats(trans):
+    """
+    Report resent transaction counters
+    """
+    st = trans.stats()
+    console.log(INFO, 'stats', " transactions %d resent %d too old to tell %d",
+                st['checked'], st['duplicates'], st['tooOld'])
+
+def printHeartbeatStats(heartbeats, hbWriter):
+    """
+    Report heartbeat counters and the stations that went silent
+    """
+    console.log(INFO, 'stats', " heartbeats %d stations %d written %d rows in %d writes",
+                heartbeats.heartbeats, len(heartbeats.last), hbWriter.rows, hbWriter.writes)
+    if (not console.enabled(INFO)):
+        return
+    for system, station, age in heartbeats.silent(heartbeatSilent):
+        console.log(INFO, 'stats', " system %d station %d silent for %d s", system, station, age)
+
+def printConsoleStats():
+    """
+    Report console output counters
+    """
+    st = console.stats()
+    console.log(INFO, 'stats', " console written %d sampled %d suppressed %d dropped %d queued %d",
+                st['written'], st['sampled'], st['suppressed'], st['dropped'], st['queued'])
+
+def reportStats(queues, pool, spool, state, hbWriter, receiver):
+    """
+    Periodic report of queue depth, pool and spool counters, transaction
+    gaps and kernel drops
+    """
+    printQueueStats(queues)
+    printPoolStats(pool)
+    printSpoolStats(spool)
+    printGapStats(state)
+    printScanStats(state.scans)
+    printTransStats(state.trans)
+    printHeartbeatStats(state.heartbeats, hbWriter)
+    printConsoleStats()
+    drops = receiver.newDrops()
+    if (drops > 0):
+        console.log(WARN, 'stats', "Kernel dropped %d packets", drops)
+
+def registerMetrics(queues, sessions, pool, spool, state, hbWriter, receiver):
+    """
+    Collectors for the values the listener parts count themselves, read
+    when the metrics endpoint is scraped
+    """
+    metrics.collector('pts_queue_depth', 'Packets waiting in a writer queue', 'gauge', ('queue',),
+                      lambda: [((i,), q.stats()['depth']) for i, q in enumerate(queues)])
+    metrics.collector('pts_queue_overflow_total', 'Writer queue overflows by outcome', 'counter',
+                      ('queue', 'outcome'),
+                      lambda: [((i, o), q.stats()[o]) for i, q in enumerate(queues)
+                               for o in ('dropped', 'spilled', 'blocked')])
+    metrics.collector('pts_db_rows_total', 'eventlog rows by outcome per writer', 'counter',
+                      ('writer', 'outcome'),
+                      lambda: [((x.name, 'written'), x.batch.written) for x in sessions] +
+                              [((x.name, 'error'), x.batch.errors) for x in sessions] +
+                              [((x.name, 'spooled'), x.batch.spooled) for x in sessions])
+    metrics.collector('pts_db_connections_total', 'Database connections by event', 'counter', ('event',),
+                      lambda: [((k,), v) for k, v in sorted(pool.stats().items())
+                               if k in ('opened', 'reconnects', 'expired')])
+    metrics.collector('pts_spool_pending', 'Batches waiting in the spool', 'gauge', (),
+                      lambda: [((), spool.stats()['pending'])])
+    metrics.collector('pts_last_cont', 'Last continuous transaction number', 'gauge', ('system',),
+                      lambda: [((x,), entry.watermark) for x, entry in state.systems.items()])
+    metrics.collector('pts_trans_gaps', 'Missing transaction ranges above lastCont', 'gauge', ('system',),
+                      lambda: [((x,), len(gaps)) for x, gaps in sorted(state.missing.items())])
+    metrics.collector('pts_heartbeat_stations', 'Stations by heartbeat state', 'gauge', ('state',),
+                      lambda: [(('seen',), len(state.heartbeats.last)),
+                               (('silent',), len(state.heartbeats.silent(heartbeatSilent)))])
+    metrics.collector('pts_console_lines_total', 'Console lines by outcome', 'counter', ('outcome',),
+                      lambda: [((k,), v) for k, v in sorted(console.stats().items()) if k != 'queued'])
+    metrics.collector('pts_kernel_drops_total', 'Datagrams the kernel dropped for the socket', 'counter', (),
+                      lambda: [((), d) for d in [receiver.drops()] if d != None])
+
+def journalDir():
+    """
+    Directory of the raw packet journal
+    """
+    if (os.name=="nt"):
+        return '.'
+    return '/var/log'
+
+# commands whose data array holds a transaction number at [5]
+JOURNAL_INDEXED = ('X', 'W', 'V')
+
+def spillFileName( num ):
+    """
+    Spill file of writer queue num
+    """
+    if (os.name=="nt"):
+        return 'pts_queue_' + str(num) + '.spill'
+    return '/var/tmp/pts_queue_' + str(num) + '.spill'
+
+def spoolDir():
+    """
+    Directory of the write-ahead spool
+    """
+    if (os.name=="nt"):
+        return '.'
+    return '/var/tmp'
+
+# Start of Main()
+def main():
+
+    print version
+    print 'MS Technology Solutions'
+
+    # setup signaling (SIGHUP = 1), stop process with kill -1 pid
+    if (os.name=="nt"):
+        signal.signal(signal.SIGINT, signal_handler)
+    else:
+        signal.signal(signal.SIGHUP, signal_handler)
+
+    # setup logging
+    print 'pts_listener.py ', os.getpid()
+    console.start()
+
+    # setup and open a socket for UDP	
+    try:
+        s = socket.socket(socket.AF_INET, socket.SOCK_DGRAM)
+        host = ''
+        port = listenPort
+        bufsize = 1024
+        #s.connect((HOST, PORT))
+        s.setsockopt(socket.SOL_SOCKET, socket.SO_REUSEADDR, 1)
+        s.bind((host, port))
+        print "Receive buffer", setReceiveBuffer(s, rcvBufSize)
+    except:
+        print "Error opening UDP socket: ", sys.exc_info()[0]
+        raise
+
+    state = ListenerState()
+    # firmware layout per sending system
+    detector = LayoutDetector(lambda fmt, *args: console.log(INFO, 'layout', fmt, *args))
+    receiver = PacketReceiver(s, recvSlots, recvBatch, bufsize)
+    journal = None
+    if (journalEnabled):
+        journal = JournalWriter(journalDir())
+
+    # setup and open a connection to the database
+    print "Opening connection"
+    pool = ConnectionPool(connectDb, dbWriters + 2, poolMaxIdle, console.logger('db'))
+    try:
+        conn = pool.borrow()
+    except Exception, e:
+        # run on the spool, the writers load the values once connected
+        console.log(WARN, 'db', "Database unreachable, starting without it  %s", e)
+    else:
+        cursor = conn.cursor()
+        state.load(cursor)
+        cursor.close()
+        pool.release(conn)
+
+    # batches written while the database is down, drained once it is back
+    spool = Spool(spoolDir(), 'pts_spool', spoolSegmentBytes, spoolSync, console.logger('spool'))
+    drainer = SpoolDrainer(spool, pool, spoolRetry, console.logger('spool'))
+    drainer.start()
+    # liveness table, written every heartbeatInterval
+    hbWriter = HeartbeatWriter(state.heartbeats, pool, heartbeatInterval)
+    hbWriter.start()
+
+    # start the database writers, one queue each
+    queues = []
+    sessions = []
+    writers = []
+    for i in range(dbWriters):
+        queue = PacketQueue(queueSize, queueOverflow, spillFileName(i))
+        session = DbSession("writer %d" % i, state, pool, spool, i)
+        writer = QueueWorker("writer %d" % i, queue, session.write, session.idle, session.close)
+        writer.start()
+        queues.append(queue)
+        sessions.append(session)
+        writers.append(writer)
+
+    # Prometheus endpoint
+    metricsServer = None
+    if (metricsPort != 0):
+        registerMetrics(queues, sessions, pool, spool, state, hbWriter, receiver)
+        try:
+            metricsServer = MetricsServer(metrics, metricsHost, metricsPort)
+            metricsServer.start()
+            print "Metrics on http://%s:%d/metrics" % (metricsHost, metricsPort)
+        except socket.error, e:
+            print "Error opening metrics port ", metricsPort, e
+
+    # periodic work of the receiver thread
+    timers = Timers()
+    timers.callEvery(statsInterval, lambda: reportStats(queues, pool, spool, state, hbWriter, receiver))
+    timers.callEvery(logFlushInterval, state.logs.flushDue)
+    if (journal != None):
+        timers.callEvery(logFlushInterval, journal.flush)
+
+    # loop forever
+    try:
+        while 1:
+            # wait for packets or the next timer
+            try:
+                readable = select.select([s], [], [], timers.timeout())[0]
+            except select.error, e:
+                if (e.args[0] == errno.EINTR):
+                    continue
+                raise
+            timers.runDue()
+            if (len(readable) == 0):
+                continue
+            # get a batch of input packets
+            for mypack, addr in receiver.receive():
+                #parse the packet
+                #print "got a packet: %s" % mypack
+                #print "Hex ", ByteToHex(mypack)
+                layout, command = detector.detect(mypack, addr[0])
+                offset = None
+                if (journal != None and command not in journalSkip):
+                    offset = journal.append(mypack, addr)
+                handler = HANDLERS.get(command)
+                if (handler != None):
+                    t0 = timer()
+                    try:
+                        dataAry = handler.receive(mypack, layout.decoders[command], state)
+                    except struct.error:
+                        # shorter than its layout, drop it and keep listening
+                        console.log(WARN, 'filter', "short packet %s from %s", command, addr[0])
+                        FILTERED.inc(('short',))
+                        continue
+                    if (dataAry != None):
+                        if (offset != None and command in JOURNAL_INDEXED):
+                            journal.indexTrans(dataAry[0], dataAry[5], offset)
+                        queues[dataAry[0] % dbWriters].put((command, dataAry), handler.droppable)
+                    elapsed = timer() - t0
+                    handler.seconds += elapsed
+                    handler.count += 1
+                    PACKETS.inc((command, ord(mypack[0])))
+                    RECEIVE_SECONDS.observe((command,), elapsed)
+            # loop forever
+    finally:
+        # let the writers drain their queues
+        for queue in queues:
+            queue.close()
+        for writer in writers:
+            writer.join(30)
+        # what is still spooled is drained after the next start
+        drainer.stop()
+        drainer.join(30)
+        # writes the last changes on the way out
+        hbWriter.stop()
+        hbWriter.join(30)
+        spool.close()
+        pool.closeAll()
+        state.logs.close()
+        if (journal != None):
+            journal.close()
+        console.stop()
+        if (metricsServer != None):
+            metricsServer.stop()
+        printHandlerStats()
+        printQueueStats(queues)
+        printPoolStats(pool)
+        printSpoolStats(spool)
+        printScanStats(state.scans)
+        printTransStats(state.trans)
+        printConsoleStats()
+        console.log(INFO, 'stats', " station names %d cached %d looked up",
+                    state.stations.hits, state.stations.misses)
+        console.log(INFO, 'stats', " received %d packets in %d calls, kernel drops %s",
+                    receiver.packets, receiver.calls, receiver.drops())
+
+    # shut down
+    s.close()
+
+if __name__ == "__main__":
+    main()
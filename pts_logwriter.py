@@ -0,0 +1,158 @@
+# pts_logwriter.py
+# Pneumatic Tube System per system packet log files
+# By MS Technology Solutions LLC
+# For Colombo Pneumatic Tube Systems Inc
+#
+# Keeps one open, buffered handle per system number instead of opening,
+# appending and closing pts_N.log for every packet.  Buffers are written
+# when flushBytes are pending or by flushDue() from a timer, and fsynced
+# on close.  Files are rotated by day (pts_N.log.YYYY-MM-DD) or by size
+# (pts_N.log.1 .. pts_N.log.<backups>).
+#
+# History:
+# v1.00     17-Oct-2026  Initial Release
+#
+import datetime
+import os
+import sys
+import threading
+
+class LogWriters(object):
+    """
+    Buffered append-only log file per system number
+      fileName   - function(lognum) returning the log file name
+      flushBytes - pending bytes that force a write
+      rotate     - 'day', 'size' or None
+      maxBytes   - file size that triggers a 'size' rotation
+      backups    - rotated files kept for 'size' rotation
+    """
+    def __init__(self, fileName, flushBytes=65536, rotate='day', maxBytes=50*1024*1024, backups=5):
+        self.fileName = fileName
+        self.flushBytes = flushBytes
+        self.rotate = rotate
+        self.maxBytes = maxBytes
+        self.backups = backups
+        self.lock = threading.Lock()
+        # lognum -> [file, pending bytes, size, day opened]
+        self.files = {}
+        # statistics
+        self.lines = 0
+        self.flushes = 0
+        self.rotations = 0
+
+    def write(self, lognum, dataAry):
+        """
+        Append the contents of the data array as one line
+        """
+        line = ''.join([str(x) + ',' for x in dataAry]) + '-\n'
+        self.lock.acquire()
+        try:
+            try:
+                entry = self.files.get(lognum)
+                if (entry == None or self.needsRotation(entry, len(line))):
+                    entry = self.open(lognum)
+                entry[0].write(line)
+                entry[1] += len(line)
+                entry[2] += len(line)
+                self.lines += 1
+                if (entry[1] >= self.flushBytes):
+                    entry[0].flush()
+                    entry[1] = 0
+                    self.flushes += 1
+            except (IOError, OSError):
+                print "\nError writing to log file ", self.fileName(lognum), sys.exc_info()[1]
+                self.files.pop(lognum, None)
+        finally:
+            self.lock.release()
+
+    def needsRotation(self, entry, length):
+        """
+        True if the file has to be rotated before the next line
+        """
+        if (self.rotate == 'day'):
+            return (entry[3] != datetime.date.today())
+        if (self.rotate == 'size'):
+            return (entry[2] + length > self.maxBytes)
+        return False
+
+    def open(self, lognum):
+        """
+        Open (rotating first if due) the log file of a system, lock must be held
+        """
+        filename = self.fileName(lognum)
+        old = self.files.pop(lognum, None)
+        if (old != None):
+            old[0].close()
+            self.rotateFile(filename, old[3])
+        elif (self.rotate == 'day' and os.path.exists(filename)):
+            # a file left from an earlier day by a previous run
+            day = datetime.date.fromtimestamp(os.path.getmtime(filename))
+            if (day != datetime.date.today()):
+                self.rotateFile(filename, day)
+        f = open(filename, 'a', 65536)
+        f.seek(0, 2)
+        entry = [f, 0, f.tell(), datetime.date.today()]
+        if (self.rotate == 'size' and entry[2] >= self.maxBytes):
+            f.close()
+            self.rotateFile(filename, entry[3])
+            f = open(filename, 'a', 65536)
+            entry = [f, 0, 0, datetime.date.today()]
+        self.files[lognum] = entry
+        return entry
+
+    def rotateFile(self, filename, day):
+        """
+        Move a closed log file out of the way
+        """
+        if (not os.path.exists(filename)):
+            return
+        if (self.rotate == 'day'):
+            target = filename + '.' + day.strftime('%Y-%m-%d')
+            if (os.path.exists(target)):
+                # same day twice, e.g. after a restart around midnight
+                target = target + '.' + datetime.datetime.now().strftime('%H%M%S')
+        else:
+            for i in range(self.backups - 1, 0, -1):
+                if (os.path.exists('%s.%d' % (filename, i))):
+                    if (os.path.exists('%s.%d' % (filename, i + 1))):
+                        os.remove('%s.%d' % (filename, i + 1))
+                    os.rename('%s.%d' % (filename, i), '%s.%d' % (filename, i + 1))
+            target = filename + '.1'
+            if (os.path.exists(target)):
+                os.remove(target)
+        os.rename(filename, target)
+        self.rotations += 1
+
+    def flushDue(self):
+        """
+        Write every pending buffer, called from a timer
+        """
+        self.lock.acquire()
+        try:
+            for lognum, entry in self.files.items():
+                if (entry[1] > 0):
+                    try:
+                        entry[0].flush()
+                        self.flushes += 1
+                    except (IOError, OSError):
+                        print "\nError writing to log file ", self.fileName(lognum), sys.exc_info()[1]
+                    entry[1] = 0
+        finally:
+            self.lock.release()
+
+    def close(self):
+        """
+        Flush, fsync and close every log file
+        """
+        self.lock.acquire()
+        try:
+            for lognum, entry in self.files.items():
+                try:
+                    entry[0].flush()
+                    os.fsync(entry[0].fileno())
+                    entry[0].close()
+                except (IOError, OSError):
+                    print "\nError closing log file ", self.fileName(lognum), sys.exc_info()[1]
+            self.files = {}
+        finally:
+            self.lock.release()
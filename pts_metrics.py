@@ -0,0 +1,189 @@
+# pts_metrics.py
+# Pneumatic Tube System metrics registry and HTTP endpoint
+# By MS Technology Solutions LLC
+# For Colombo Pneumatic Tube Systems Inc
+#
+# Counters and histograms are plain dictionaries keyed by their label
+# values and updated without a lock: one dictionary lookup and an add per
+# packet.  Most are only written by one thread (the receiver thread, or the
+# writer of a system); with several writer threads an increment of a shared
+# series can very rarely be lost, which is fine for monitoring.  Values the
+# listener already counts elsewhere (queue depth, pool, spool, filters) are
+# read by collector functions when the endpoint is scraped, so they cost
+# nothing per packet.
+#
+# MetricsServer answers GET /metrics on a local port with every metric in
+# the Prometheus text exposition format (version 0.0.4).
+#
+# History:
+# v1.00     17-Oct-2026  Initial Release
+#
+import BaseHTTPServer
+import bisect
+import sys
+import threading
+
+# seconds, from a struct unpack to a slow database commit
+LATENCY_BOUNDS = (0.00001, 0.000025, 0.00005, 0.0001, 0.00025, 0.0005, 0.001, 0.0025,
+                  0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5)
+
+def formatLabels( names, values, extra='' ):
+    """
+    {name="value",...} of a series, '' without labels
+    """
+    pairs = ['%s="%s"' % (n, str(v).replace('\\', '\\\\').replace('"', '\\"').replace('\n', '\\n'))
+             for n, v in zip(names, values)]
+    if (extra != ''):
+        pairs.append(extra)
+    if (len(pairs) == 0):
+        return ''
+    return '{' + ','.join(pairs) + '}'
+
+def formatValue( v ):
+    if (isinstance(v, float)):
+        return repr(v)
+    return str(v)
+
+class Counter(object):
+    """
+    Monotonic count per label values
+    """
+    type = 'counter'
+
+    def __init__(self, name, help, labels=()):
+        self.name = name
+        self.help = help
+        self.labels = labels
+        # label values tuple -> count
+        self.values = {}
+
+    def inc(self, key=(), n=1):
+        values = self.values
+        values[key] = values.get(key, 0) + n
+
+    def render(self, out):
+        for key, v in sorted(self.values.items()):
+            out.append('%s%s %s' % (self.name, formatLabels(self.labels, key), formatValue(v)))
+
+class Histogram(object):
+    """
+    Distribution of observed values per label values, fixed bucket bounds
+    """
+    type = 'histogram'
+
+    def __init__(self, name, help, labels=(), bounds=LATENCY_BOUNDS):
+        self.name = name
+        self.help = help
+        self.labels = labels
+        self.bounds = bounds
+        # label values tuple -> [counts per bucket and one for +Inf, sum, count]
+        self.series = {}
+
+    def observe(self, key, value):
+        entry = self.series.get(key)
+        if (entry == None):
+            entry = self.series[key] = [[0] * (len(self.bounds) + 1), 0.0, 0]
+        entry[0][bisect.bisect_left(self.bounds, value)] += 1
+        entry[1] += value
+        entry[2] += 1
+
+    def render(self, out):
+        for key, (counts, total, count) in sorted(self.series.items()):
+            cumulative = 0
+            for bound, n in zip(self.bounds, counts):
+                cumulative += n
+                out.append('%s_bucket%s %d' % (self.name, formatLabels(self.labels, key, 'le="%r"' % bound),
+                                               cumulative))
+            out.append('%s_bucket%s %d' % (self.name, formatLabels(self.labels, key, 'le="+Inf"'), count))
+            out.append('%s_sum%s %r' % (self.name, formatLabels(self.labels, key), total))
+            out.append('%s_count%s %d' % (self.name, formatLabels(self.labels, key), count))
+
+class Collector(object):
+    """
+    Values read from elsewhere when scraped
+      collect - function returning [(label values tuple, value)]
+      type    - 'counter' or 'gauge'
+    """
+    def __init__(self, name, help, type, labels, collect):
+        self.name = name
+        self.help = help
+        self.type = type
+        self.labels = labels
+        self.collect = collect
+
+    def render(self, out):
+        for key, v in self.collect():
+            out.append('%s%s %s' % (self.name, formatLabels(self.labels, key), formatValue(v)))
+
+class Metrics(object):
+    """
+    Registry of every metric, in registration order
+    """
+    def __init__(self):
+        self.metrics = []
+        self.lock = threading.Lock()
+
+    def add(self, metric):
+        self.lock.acquire()
+        self.metrics.append(metric)
+        self.lock.release()
+        return metric
+
+    def counter(self, name, help, labels=()):
+        return self.add(Counter(name, help, labels))
+
+    def histogram(self, name, help, labels=(), bounds=LATENCY_BOUNDS):
+        return self.add(Histogram(name, help, labels, bounds))
+
+    def collector(self, name, help, type, labels, collect):
+        return self.add(Collector(name, help, type, labels, collect))
+
+    def render(self):
+        """
+        Every metric in the Prometheus text format
+        """
+        self.lock.acquire()
+        metrics = list(self.metrics)
+        self.lock.release()
+        out = []
+        for metric in metrics:
+            out.append('# HELP %s %s' % (metric.name, metric.help))
+            out.append('# TYPE %s %s' % (metric.name, metric.type))
+            try:
+                metric.render(out)
+            except:
+                print "\nError collecting metric ", metric.name, sys.exc_info()[0], sys.exc_info()[1]
+        return '\n'.join(out) + '\n'
+
+class MetricsRequestHandler(BaseHTTPServer.BaseHTTPRequestHandler):
+    def do_GET(self):
+        if (self.path.split('?')[0] not in ('/metrics', '/')):
+            self.send_error(404)
+            return
+        body = self.server.metrics.render()
+        self.send_response(200)
+        self.send_header('Content-Type', 'text/plain; version=0.0.4')
+        self.send_header('Content-Length', str(len(body)))
+        self.end_headers()
+        self.wfile.write(body)
+
+    def log_message(self, format, *args):
+        # a scrape every few seconds is not worth a console line
+        pass
+
+class MetricsServer(threading.Thread):
+    """
+    Thread serving the registry on http://host:port/metrics
+    """
+    def __init__(self, metrics, host='127.0.0.1', port=9236):
+        threading.Thread.__init__(self, name='metrics')
+        self.daemon = True
+        self.server = BaseHTTPServer.HTTPServer((host, port), MetricsRequestHandler)
+        self.server.metrics = metrics
+
+    def run(self):
+        self.server.serve_forever(0.5)
+
+    def stop(self):
+        self.server.shutdown()
+        self.server.server_close()
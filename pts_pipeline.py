@@ -0,0 +1,229 @@
+# pts_pipeline.py
+# Pneumatic Tube System ingest pipeline
+# Bounded queue between the UDP receiver and the database writer threads
+# By MS Technology Solutions LLC
+# For Colombo Pneumatic Tube Systems Inc
+#
+# The receiver thread only decodes and enqueues; one or more writer threads
+# drain the queue into MySQL, so a database stall no longer blocks the
+# socket.  What happens when the queue is full is set per queue:
+#   'block' - the receiver waits for a writer (the kernel buffers meanwhile)
+#   'spill' - items go to a spill file on disk and are read back in order
+#   'drop'  - the oldest queued droppable item is discarded to make room;
+#             with none queued a droppable item is discarded itself and
+#             any other item waits as in 'block'
+# The caller decides what is droppable: the listener passes card scans and
+# events, which are rows of their own and still in the packet log and the
+# journal for pts_replay.py, never transactions or parameter blocks.
+#
+# History:
+# v1.00     17-Oct-2026  Initial Release
+# v1.01     17-Oct-2026  'drop' discards the oldest droppable item before a new one
+# v1.02     17-Oct-2026  Errors in idle and finish no longer end the worker thread
+#
+import collections
+import cPickle
+import os
+import sys
+import threading
+import time
+
+OVERFLOW_POLICIES = ('block', 'spill', 'drop')
+
+class PacketQueue(object):
+    """
+    Bounded FIFO with a configurable overflow policy and depth metrics
+    """
+    def __init__(self, maxsize, overflow='block', spillFile=None):
+        if (overflow not in OVERFLOW_POLICIES):
+            raise ValueError("unknown overflow policy %s" % overflow)
+        if (overflow == 'spill' and spillFile == None):
+            raise ValueError("spill policy needs a spill file")
+        self.maxsize = maxsize
+        self.overflow = overflow
+        self.spillFile = spillFile
+        self.cond = threading.Condition()
+        # items are (droppable, item)
+        self.items = collections.deque()
+        self.droppable = 0
+        self.closed = False
+        # spill file handles, only open while spilled items are pending
+        self.spillWriter = None
+        self.spillReader = None
+        self.spilled = 0
+        # metrics
+        self.puts = 0
+        self.maxDepth = 0
+        self.dropped = 0
+        self.spillCount = 0
+        self.blocked = 0
+
+    def put(self, item, droppable=False):
+        """
+        Add an item, applying the overflow policy when the queue is full
+        """
+        self.cond.acquire()
+        try:
+            self.puts += 1
+            if (self.spilled > 0):
+                # keep order, everything goes to disk until the spill is drained
+                self.spill(item)
+                return
+            if (len(self.items) >= self.maxsize):
+                if (self.overflow == 'spill'):
+                    self.spill(item)
+                    return
+                if (self.overflow == 'drop'):
+                    if (self.droppable > 0):
+                        self.dropOldest()
+                    elif (droppable):
+                        self.dropped += 1
+                        return
+                if (len(self.items) >= self.maxsize):
+                    self.blocked += 1
+                    while (len(self.items) >= self.maxsize and not self.closed):
+                        self.cond.wait()
+            self.items.append((droppable, item))
+            if (droppable):
+                self.droppable += 1
+            if (len(self.items) > self.maxDepth):
+                self.maxDepth = len(self.items)
+            self.cond.notify_all()
+        finally:
+            self.cond.release()
+
+    def dropOldest(self):
+        """
+        Remove the oldest droppable item, lock must be held
+        """
+        for i in range(len(self.items)):
+            if (self.items[i][0]):
+                del self.items[i]
+                self.droppable -= 1
+                self.dropped += 1
+                return
+
+    def spill(self, item):
+        """
+        Append an item to the spill file, lock must be held
+        """
+        if (self.spillWriter == None):
+            self.spillWriter = open(self.spillFile, 'wb')
+            self.spillReader = open(self.spillFile, 'rb')
+        cPickle.dump(item, self.spillWriter, cPickle.HIGHEST_PROTOCOL)
+        self.spillWriter.flush()
+        self.spilled += 1
+        self.spillCount += 1
+        self.cond.notify_all()
+
+    def unspill(self):
+        """
+        Read the oldest spilled item back, lock must be held
+        """
+        item = cPickle.load(self.spillReader)
+        self.spilled -= 1
+        if (self.spilled == 0):
+            # drained, start over with an empty file
+            self.spillWriter.close()
+            self.spillReader.close()
+            self.spillWriter = None
+            self.spillReader = None
+            os.remove(self.spillFile)
+        return item
+
+    def get(self, timeout=None):
+        """
+        Remove and return the oldest item
+        Returns None on timeout or when the queue is closed and empty
+        """
+        self.cond.acquire()
+        try:
+            if (timeout != None):
+                endtime = time.time() + timeout
+            while (len(self.items) == 0 and self.spilled == 0):
+                if (self.closed):
+                    return None
+                if (timeout == None):
+                    self.cond.wait()
+                else:
+                    remaining = endtime - time.time()
+                    if (remaining <= 0):
+                        return None
+                    self.cond.wait(remaining)
+            if (len(self.items) == 0):
+                return self.unspill()
+            droppable, item = self.items.popleft()
+            if (droppable):
+                self.droppable -= 1
+            # refill from disk so spilled items keep their place in line
+            if (self.spilled > 0):
+                self.items.append((False, self.unspill()))
+            self.cond.notify_all()
+            return item
+        finally:
+            self.cond.release()
+
+    def close(self):
+        """
+        Wake up all waiters, get() returns None once the queue is empty
+        """
+        self.cond.acquire()
+        self.closed = True
+        self.cond.notify_all()
+        self.cond.release()
+
+    def depth(self):
+        """
+        Items waiting, in memory and on disk
+        """
+        return len(self.items) + self.spilled
+
+    def stats(self):
+        """
+        Queue metrics as a dictionary
+        """
+        return {'depth': self.depth(), 'maxDepth': self.maxDepth, 'puts': self.puts,
+                'dropped': self.dropped, 'spilled': self.spillCount, 'blocked': self.blocked}
+
+class QueueWorker(threading.Thread):
+    """
+    Thread draining a PacketQueue
+      work - function(item) called for every item
+      idle - function() returning the seconds until it wants to be called
+             again, called after every item and whenever that time passes
+      finish - function() called once the queue is closed and drained
+      errorDelay - seconds before idle is called again after it failed
+    """
+    def __init__(self, name, queue, work, idle=None, finish=None, errorDelay=1.0):
+        threading.Thread.__init__(self, name=name)
+        self.daemon = True
+        self.queue = queue
+        self.work = work
+        self.idle = idle
+        self.finish = finish
+        self.errorDelay = errorDelay
+
+    def run(self):
+        timeout = None
+        while 1:
+            item = self.queue.get(timeout)
+            if (item != None):
+                try:
+                    self.work(item)
+                except:
+                    print "\nError in", self.name, sys.exc_info()[0], sys.exc_info()[1]
+            elif (self.queue.closed and self.queue.depth() == 0):
+                break
+            if (self.idle != None):
+                # the time based flush writes most batches, a full disk or a
+                # lost connection there must not end the thread
+                try:
+                    timeout = self.idle()
+                except:
+                    print "\nError in", self.name, "idle", sys.exc_info()[0], sys.exc_info()[1]
+                    timeout = self.errorDelay
+        if (self.finish != None):
+            try:
+                self.finish()
+            except:
+                print "\nError in", self.name, "finish", sys.exc_info()[0], sys.exc_info()[1]
@@ -0,0 +1,183 @@
+# pts_recv.py
+# Pneumatic Tube System UDP receive stage
+# Pulls datagrams into a ring of preallocated buffers, many per system call
+# By MS Technology Solutions LLC
+# For Colombo Pneumatic Tube Systems Inc
+#
+# On Linux recvmmsg is called through ctypes and returns up to a batch of
+# datagrams per call.  Elsewhere (the Windows console box) recvfrom_into
+# fills the same ring one datagram at a time.  Either way no new string is
+# allocated per packet: receive() hands out memoryview slices of the ring,
+# which the struct decoders in pts_decode.py read directly.  A slice stays
+# valid until the ring wraps around, i.e. for the next 'slots' datagrams.
+#
+# History:
+# v1.00     17-Oct-2026  Initial Release
+# v1.01     17-Oct-2026  Add newDrops for periodic reports
+#
+import ctypes
+import errno
+import os
+import socket
+import struct
+import sys
+
+MSG_WAITFORONE = 0x10000
+
+class iovec(ctypes.Structure):
+    _fields_ = [("iov_base", ctypes.c_void_p),
+                ("iov_len", ctypes.c_size_t)]
+
+class msghdr(ctypes.Structure):
+    _fields_ = [("msg_name", ctypes.c_void_p),
+                ("msg_namelen", ctypes.c_uint32),
+                ("msg_iov", ctypes.POINTER(iovec)),
+                ("msg_iovlen", ctypes.c_size_t),
+                ("msg_control", ctypes.c_void_p),
+                ("msg_controllen", ctypes.c_size_t),
+                ("msg_flags", ctypes.c_int)]
+
+class mmsghdr(ctypes.Structure):
+    _fields_ = [("msg_hdr", msghdr),
+                ("msg_len", ctypes.c_uint)]
+
+# sockaddr_in: family, port, address, zero padding
+SOCKADDR_IN = struct.Struct('!2xH4s8x')
+
+def loadRecvmmsg():
+    """
+    Return libc recvmmsg, or None where it is not available
+    """
+    if (not sys.platform.startswith('linux')):
+        return None
+    try:
+        libc = ctypes.CDLL(None, use_errno=True)
+        fn = libc.recvmmsg
+    except (OSError, AttributeError):
+        return None
+    fn.restype = ctypes.c_int
+    fn.argtypes = [ctypes.c_int, ctypes.c_void_p, ctypes.c_uint,
+                   ctypes.c_int, ctypes.c_void_p]
+    return fn
+
+def setReceiveBuffer( sock, size ):
+    """
+    Set SO_RCVBUF and return the size the kernel actually granted
+    Linux doubles the value and caps it at net.core.rmem_max
+    """
+    try:
+        sock.setsockopt(socket.SOL_SOCKET, socket.SO_RCVBUF, size)
+    except socket.error:
+        print "Error setting receive buffer to", size, sys.exc_info()[1]
+    return sock.getsockopt(socket.SOL_SOCKET, socket.SO_RCVBUF)
+
+class PacketReceiver(object):
+    """
+    Batched receive into a reusable ring of buffers
+    """
+    def __init__(self, sock, slots=256, batch=64, bufsize=1024):
+        self.sock = sock
+        self.slots = slots
+        self.batch = min(batch, slots)
+        self.bufsize = bufsize
+        self.head = 0
+        # statistics
+        self.packets = 0
+        self.calls = 0
+        # preallocated ring
+        self.buffers = [bytearray(bufsize) for i in range(slots)]
+        self.views = [memoryview(b) for b in self.buffers]
+        self.recvmmsg = loadRecvmmsg()
+        if (self.recvmmsg != None):
+            self.setupMessages()
+        self.lastDrops = self.drops()
+
+    def setupMessages(self):
+        """
+        Point one mmsghdr per slot at its ring buffer and address storage
+        """
+        self.names = (ctypes.c_char * (SOCKADDR_IN.size * self.slots))()
+        self.iovecs = (iovec * self.slots)()
+        self.msgs = (mmsghdr * self.slots)()
+        # keep the ctypes views alive, they pin the bytearrays
+        self.pins = [(ctypes.c_char * self.bufsize).from_buffer(b) for b in self.buffers]
+        for i in range(self.slots):
+            self.iovecs[i].iov_base = ctypes.addressof(self.pins[i])
+            self.iovecs[i].iov_len = self.bufsize
+            hdr = self.msgs[i].msg_hdr
+            hdr.msg_name = ctypes.addressof(self.names) + i * SOCKADDR_IN.size
+            hdr.msg_iov = ctypes.pointer(self.iovecs[i])
+            hdr.msg_iovlen = 1
+
+    def receive(self):
+        """
+        Block until at least one datagram arrives
+        Returns a list of (packet, (host, port)), packet is a memoryview
+        """
+        if (self.recvmmsg == None):
+            return self.receiveOne()
+        head = self.head
+        count = min(self.batch, self.slots - head)
+        for i in range(head, head + count):
+            self.msgs[i].msg_hdr.msg_namelen = SOCKADDR_IN.size
+        n = self.recvmmsg(self.sock.fileno(), ctypes.addressof(self.msgs) + head * ctypes.sizeof(mmsghdr),
+                          count, MSG_WAITFORONE, None)
+        self.calls += 1
+        if (n < 0):
+            err = ctypes.get_errno()
+            if (err == errno.EINTR or err == errno.EAGAIN):
+                return []
+            raise socket.error(err, os.strerror(err))
+        packets = []
+        for i in range(head, head + n):
+            port, addr = SOCKADDR_IN.unpack_from(self.names, i * SOCKADDR_IN.size)
+            packets.append((self.views[i][:self.msgs[i].msg_len], (socket.inet_ntoa(addr), port)))
+        self.head = (head + n) % self.slots
+        self.packets += n
+        return packets
+
+    def receiveOne(self):
+        """
+        Fallback for platforms without recvmmsg
+        """
+        view = self.views[self.head]
+        try:
+            n, addr = self.sock.recvfrom_into(view)
+        except socket.error, e:
+            if (e.args[0] == errno.EINTR):
+                return []
+            raise
+        self.calls += 1
+        self.head = (self.head + 1) % self.slots
+        self.packets += 1
+        return [(view[:n], addr)]
+
+    def drops(self):
+        """
+        Datagrams the kernel dropped for this socket, None if unknown
+        Read from the drops column of /proc/net/udp
+        """
+        try:
+            inode = str(os.fstat(self.sock.fileno()).st_ino)
+            f = open('/proc/net/udp')
+            try:
+                for line in f:
+                    fields = line.split()
+                    if (len(fields) > 12 and fields[9] == inode):
+                        return int(fields[12])
+            finally:
+                f.close()
+        except (IOError, OSError):
+            pass
+        return None
+
+    def newDrops(self):
+        """
+        Datagrams the kernel dropped since the previous call, 0 if unknown
+        """
+        drops = self.drops()
+        if (drops == None or self.lastDrops == None):
+            return 0
+        count = drops - self.lastDrops
+        self.lastDrops = drops
+        return count
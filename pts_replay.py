@@ -0,0 +1,353 @@
+# pts_replay.py
+# Pneumatic Tube System packet replay
+# Bulk loads packets from the per system logs and the raw journal into eventlog
+# By MS Technology Solutions LLC
+# For Colombo Pneumatic Tube Systems Inc
+#
+# A packet whose database write failed is still in pts_N.log (written before
+# the database) and, since v1.49.10, in the raw journal.  Every packet is
+# taken through the listener's own handlers: journal frames are decoded with
+# the layout detected for their sender and filtered by the handler's accept
+# function, log lines already hold the decoded data array.  Station names
+# come from the listener's cache; replayed parameter blocks update the cache
+# in packet order but the station table itself is left alone.
+#
+# Rows whose (System, TransNum, EventType) is already in eventlog are
+# skipped.  Card scans and events carry TransNum 0, so for those EventStart,
+# Source and ReceiverID (station and card) are part of the key.  The
+# existing keys are read once per system for the replayed range, and the
+# new rows are written with multi-row INSERTs of batchRows rows per commit
+# (pts_sink.py).  The same packet found in a log and in the
+# journal is written once.
+#
+# Usage: pts_replay.py [-n] [-v] [-s since] [-u until] [file ...]
+#   without files every pts_N.log (including rotated ones) and every journal
+#   is read; since/until are 'YYYY-MM-DD' or 'YYYY-MM-DD HH:MM', without -s
+#   the range starts replayDays days before until (or now), so a bare run
+#   does not load every log ever kept into memory
+#
+# History:
+# v1.00     17-Oct-2026  Initial Release
+# v1.01     17-Oct-2026  Statements from pts_sql
+# v1.02     17-Oct-2026  Handler output through the listener console at debug level
+# v1.03     17-Oct-2026  Event keys in PTS time, converted in bulk by pts_clock
+# v1.04     17-Oct-2026  Source and ReceiverID in the keys of TransNum 0 rows
+# v1.05     17-Oct-2026  Default to the last replayDays days when -s is not given
+version = 'pts_replay.py version 1.05 17-Oct-26'
+#
+# settings
+listenerFile = 'pts_listener_v1.49.py' # handlers, decode and enrich path
+batchRows = 5000 # eventlog rows per multi-row INSERT and commit
+replayDays = 1 # days before until (or now) replayed without -s
+progressRows = 50000 # packets between progress lines
+outputFile = 'pts_replay.log' # console output of the handlers unless -v
+#
+import datetime
+import getopt
+import glob
+import imp
+import os
+import re
+import struct
+import sys
+import time
+from pts_decode import LayoutDetector
+from pts_journal import readFrames, JournalIndex
+from pts_sink import EventBatch
+from pts_sql import SELECT_TRANS_KEYS, SELECT_EVENT_KEYS
+from pts_clock import PtsClock
+
+# loaded in main()
+listener = None
+
+# decoded fields per command byte as written by LogWriters
+LOG_FIELDS = {'X': 12, 'V': 12, 'W': 10, 'w': 10, 'S': 19, 'K': 12}
+# parameter block fields holding station names
+PARBLOCK_NAMES = range(6, 16)
+# commands that only update the station name cache
+STATION_UPDATES = ('S',)
+# rotated logs are pts_N.log.YYYY-MM-DD[.HHMMSS] or pts_N.log.<n>
+LOG_NAME = re.compile(r'^pts_\d+\.log(\.[\d-]+)*$')
+# PTS time conversion
+clock = PtsClock()
+
+def parseLogLine( line ):
+    """
+    Split a pts_N.log line back into (command, dataAry)
+    Returns (None, None) for lines that are not a replayable packet
+    """
+    fields = line.rstrip('\r\n').split(',')
+    if (len(fields) < 5 or fields[-1] != '-'):
+        return None, None
+    fields = fields[:-1]
+    try:
+        # v1.5 card scans keep the device id, their command is one byte later
+        command = chr(int(fields[2]))
+        if (command not in LOG_FIELDS):
+            command = chr(int(fields[3]))
+        if (LOG_FIELDS.get(command) != len(fields)):
+            # unknown command, or a station name holding a comma
+            return None, None
+        dataAry = []
+        for i in range(len(fields)):
+            if (command == 'S' and i in PARBLOCK_NAMES):
+                dataAry.append(fields[i])
+            else:
+                dataAry.append(int(fields[i]))
+    except ValueError:
+        return None, None
+    return command, dataAry
+
+def packetTime( command, dataAry ):
+    """
+    PTS time (seconds since 1980) of a packet, None for parameter blocks
+    """
+    if (command == 'K'):
+        return dataAry[11]
+    if (command in STATION_UPDATES):
+        return None
+    return dataAry[6]
+
+def inRange( command, dataAry, since, until ):
+    """
+    True if a packet lies between since and until (PTS time, None for open)
+    """
+    t = packetTime(command, dataAry)
+    if (t == None):
+        return True
+    return ((since == None or t >= since) and (until == None or t < until))
+
+def readLog( filename, since, until ):
+    """
+    Iterate (command, dataAry) from a packet log
+    """
+    f = open(filename, 'r')
+    try:
+        for line in f:
+            command, dataAry = parseLogLine(line)
+            if (command != None and inRange(command, dataAry, since, until)):
+                yield command, dataAry
+    finally:
+        f.close()
+
+def readJournal( filename, state, since, until ):
+    """
+    Iterate (command, dataAry) from a raw journal, decoded like main() does
+    since/until are receive times (seconds since the epoch, None for open)
+    """
+    detector = LayoutDetector()
+    offset = 0
+    if (since != None):
+        offset = JournalIndex(filename).offsetForTime(since)
+    for offset, recvTime, addr, packet in readFrames(filename, offset):
+        if ((since != None and recvTime < since) or (until != None and recvTime >= until)):
+            continue
+        layout, command = detector.detect(packet, addr[0])
+        handler = listener.HANDLERS.get(command)
+        if (handler == None or handler.decode == False):
+            continue
+        try:
+            dataAry = layout.decoders[command](packet)
+        except struct.error:
+            print "\nShort packet in", filename, "at", offset
+            continue
+        if (handler.accept != None and not handler.accept(dataAry, state)):
+            continue
+        yield command, dataAry
+
+def defaultSources():
+    """
+    Every packet log and journal at the places the listener writes them
+    """
+    logDir = os.path.dirname(listener.logFileName(0)) or '.'
+    logs = [os.path.join(logDir, name) for name in os.listdir(logDir) if LOG_NAME.match(name)]
+    # oldest first, so station names change in the order they did
+    logs.sort(key=os.path.getmtime)
+    journals = sorted(glob.glob(os.path.join(listener.journalDir(), 'pts_journal_*.bin')))
+    return logs + journals
+
+def eventKey( command, dataAry ):
+    """
+    (System, TransNum, EventType) of the eventlog row a decoded packet inserts,
+    with EventStart (PTS time), Source and ReceiverID added when TransNum is 0
+    """
+    if (command in ('X', 'V')):
+        # events leave ReceiverID NULL
+        key = (dataAry[0], dataAry[5], dataAry[10])
+        extra = (dataAry[8], None)
+    elif (command == 'K'):
+        key = (dataAry[0], 0, dataAry[3])
+        extra = (dataAry[4], dataAry[7])
+    else:
+        # station and card ID
+        key = (dataAry[0], dataAry[5], dataAry[8])
+        extra = (dataAry[3], dataAry[7])
+    if (key[1] == 0):
+        key = key + (packetTime(command, dataAry),) + extra
+    return key
+
+def keyRanges( packets ):
+    """
+    Per system [lowest TransNum, highest TransNum, first EventStart, last EventStart]
+    of the keys to look up, the EventStart range only covers TransNum 0
+    """
+    ranges = {}
+    for command, dataAry in packets:
+        if (command in STATION_UPDATES):
+            continue
+        key = eventKey(command, dataAry)
+        r = ranges.setdefault(key[0], [None, None, None, None])
+        if (key[1] != 0):
+            if (r[0] == None or key[1] < r[0]):
+                r[0] = key[1]
+            if (r[1] == None or key[1] > r[1]):
+                r[1] = key[1]
+        else:
+            if (r[2] == None or key[3] < r[2]):
+                r[2] = key[3]
+            if (r[3] == None or key[3] > r[3]):
+                r[3] = key[3]
+    return ranges
+
+def loadExistingKeys( dbcursor, ranges ):
+    """
+    Read the keys of the eventlog rows that are already in the database
+    """
+    keys = set()
+    for system, (low, high, first, last) in ranges.items():
+        if (low != None):
+            dbcursor.execute(SELECT_TRANS_KEYS, (system, low, high))
+            for row in dbcursor.fetchall():
+                keys.add(tuple(row))
+        if (first != None):
+            dbcursor.execute(SELECT_EVENT_KEYS, tuple([system] + clock.texts((first, last))))
+            rows = dbcursor.fetchall()
+            keys.update([(row[0], row[1], row[2], clock.seconds(row[3]), row[4], row[5]) for row in rows])
+    return keys
+
+def replay( packets, keys, state, dbcursor, batch ):
+    """
+    Enrich and write every packet whose key is not in keys
+    Returns (written, duplicates)
+    """
+    written = 0
+    duplicates = 0
+    for command, dataAry in packets:
+        handler = listener.HANDLERS[command]
+        if (command in STATION_UPDATES):
+            handler.update(dataAry, state)
+            continue
+        key = eventKey(command, dataAry)
+        if (key in keys):
+            duplicates += 1
+            continue
+        keys.add(key)
+        if (handler.enrich != None):
+            handler.enrich(dataAry, state.stations, dbcursor)
+        for sink in handler.sinks:
+            sink(dataAry, batch)
+        written += 1
+        if (written % progressRows == 0):
+            sys.stderr.write("%d packets written, %d duplicates\n" % (written, duplicates))
+    batch.flush()
+    return written, duplicates
+
+def parseTime( text ):
+    """
+    Parse a 'YYYY-MM-DD' or 'YYYY-MM-DD HH:MM' command line time
+    """
+    for fmt in ('%Y-%m-%d %H:%M', '%Y-%m-%d'):
+        try:
+            return datetime.datetime.strptime(text, fmt)
+        except ValueError:
+            pass
+    raise ValueError("bad time '%s', use YYYY-MM-DD or 'YYYY-MM-DD HH:MM'" % text)
+
+def usage():
+    print "Usage: pts_replay.py [-n] [-v] [-s since] [-u until] [file ...]"
+    print "  -n  dry run, count the packets that would be written"
+    print "  -v  keep handler output on the console instead of", outputFile
+    print "  -s  first packet time, 'YYYY-MM-DD' or 'YYYY-MM-DD HH:MM'"
+    print "      (default %d day(s) before the end of the range)" % replayDays
+    print "  -u  end of the packet time range (default now)"
+
+# Start of Main()
+def main():
+    global listener
+
+    print version
+    print 'MS Technology Solutions'
+
+    try:
+        opts, files = getopt.getopt(sys.argv[1:], 'nvs:u:h')
+        opts = dict(opts)
+        since = until = None
+        if ('-s' in opts):
+            since = parseTime(opts['-s'])
+        if ('-u' in opts):
+            until = parseTime(opts['-u'])
+        if (since == None):
+            # bounded, everything is held in memory for the key lookups
+            since = (until or datetime.datetime.now()) - datetime.timedelta(days=replayDays)
+    except (getopt.GetoptError, ValueError), e:
+        print e
+        usage()
+        return 2
+    if ('-h' in opts):
+        usage()
+        return 0
+    print "Packets from", since, "until", until or "now"
+
+    listener = imp.load_source('pts_listener', listenerFile)
+    # every row the handlers write, the console is never started so output stays in order
+    listener.console.level = listener.DEBUG
+    listener.console.maxRate = 0
+    state = listener.ListenerState()
+    if (len(files) == 0):
+        files = defaultSources()
+
+    stdout = sys.stdout
+    if ('-v' not in opts):
+        # the handlers print every row, a console cannot keep up with that
+        sys.stdout = open(outputFile, 'a', 65536)
+    start = time.time()
+    try:
+        # read everything first, the key lookups need the ranges
+        packets = []
+        for filename in files:
+            print >>stdout, "Reading", filename
+            if (filename.endswith('.bin')):
+                packets.extend(readJournal(filename, state,
+                    since and time.mktime(since.timetuple()), until and time.mktime(until.timetuple())))
+            else:
+                packets.extend(readLog(filename, since and clock.seconds(since), until and clock.seconds(until)))
+        print >>stdout, len(packets), "packets read in %.1f s" % (time.time() - start)
+
+        conn = listener.connectDb()
+        cursor = conn.cursor()
+        keys = loadExistingKeys(cursor, keyRanges(packets))
+        print >>stdout, len(keys), "rows already in eventlog"
+        state.stations.load(cursor)
+
+        batch = EventBatch(batchRows, 0)
+        batch.cursor = cursor
+        if ('-n' in opts):
+            # count only, nothing is written
+            batch.add = lambda sql, params: None
+        t0 = time.time()
+        written, duplicates = replay(packets, keys, state, cursor, batch)
+        seconds = max(time.time() - t0, 0.001)
+        cursor.close()
+        conn.close()
+    finally:
+        if (sys.stdout != stdout):
+            sys.stdout.close()
+            sys.stdout = stdout
+
+    print "%d packets replayed, %d duplicates skipped, %d rows written, %d errors" % \
+          (written, duplicates, batch.written, batch.errors)
+    print "%.1f s, %d packets/s" % (seconds, written / seconds)
+    return 0
+
+if __name__ == "__main__":
+    sys.exit(main())
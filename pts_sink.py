@@ -0,0 +1,245 @@
+# pts_sink.py
+# Pneumatic Tube System batching database sink
+# Groups eventlog statements and writes them with executemany
+# By MS Technology Solutions LLC
+# For Colombo Pneumatic Tube Systems Inc
+#
+# Statements are kept in arrival order as groups of consecutive rows for
+# the same statement text.  MySQLdb turns executemany of an INSERT ...
+# VALUES into one multi-row INSERT, so a resent transaction history costs
+# one round trip per group instead of one per packet.  A batch is flushed
+# when it holds maxRows rows or its oldest row is maxDelay seconds old,
+# whichever comes first, and committed once.
+#
+# With a spool (pts_spool.py) attached, a batch that cannot be written
+# because the database is down goes to disk instead, and so does every
+# batch after it until the spool has been drained.
+#
+# flush(atomic=True) writes a batch all or nothing, for statements that
+# only make sense together (the station rows of a parameter block).  When
+# it fails for another reason than the database being down it is rolled
+# back and kept for the next flush, and given up after atomicAttempts
+# tries; it is never written row by row.
+#
+# History:
+# v1.00     17-Oct-2026  Initial Release
+# v1.01     17-Oct-2026  Retry a batch once on a replacement connection
+# v1.02     17-Oct-2026  Fall back to the write-ahead spool while the database is down
+# v1.03     17-Oct-2026  Transaction control statements from pts_sql
+# v1.04     17-Oct-2026  Commit timing callback for the metrics endpoint
+# v1.05     17-Oct-2026  Callback for every row the row by row retry could not write
+# v1.06     17-Oct-2026  Keep the rows without a connection and a spool instead of failing
+# v1.07     17-Oct-2026  All-or-nothing batches, rolled back and kept instead of written row by row
+# v1.08     17-Oct-2026  Errors reported through a log function
+#
+import sys
+import time
+from pts_console import printLog, WARN, ERROR
+from pts_dbpool import isDatabaseDown
+from pts_sql import START_TRANSACTION, COMMIT, ROLLBACK
+
+def formatRow( row ):
+    """
+    Values of a row that could not be written, for the log
+    """
+    return ' '.join(['%s' % (x,) for x in row])
+
+class EventBatch(object):
+    """
+    Ordered batch of parameterized statements with a size/time flush policy
+    """
+    def __init__(self, maxRows=500, maxDelay=0.2):
+        self.maxRows = maxRows
+        self.maxDelay = maxDelay
+        # cursor of the writer's open connection, None while closed
+        self.cursor = None
+        # function(exception) returning a cursor on a new connection, or
+        # None if the error was not a lost connection
+        self.reconnect = None
+        # Spool taking batches while the database is down, None to drop them
+        self.spool = None
+        # function(seconds, rows) called after each committed batch, None for none
+        self.timing = None
+        # function(sql, params) called for each row that could not be written, None for none
+        self.failed = None
+        # function(level, fmt, *args) reporting write errors
+        self.log = printLog
+        # failed tries before an all-or-nothing batch is given up
+        self.atomicAttempts = 3
+        # list of [sql, rows]
+        self.groups = []
+        # all-or-nothing batches kept for another try, (groups, rows, attempts)
+        self.held = []
+        self.rows = 0
+        self.firstTime = 0
+        # statistics
+        self.flushes = 0
+        self.written = 0
+        self.errors = 0
+        self.spooled = 0
+
+    def add(self, sql, params):
+        """
+        Queue one row, flushing when the batch is full
+        """
+        if (self.rows == 0):
+            self.firstTime = time.time()
+        if (len(self.groups) > 0 and self.groups[-1][0] == sql):
+            self.groups[-1][1].append(params)
+        else:
+            self.groups.append([sql, [params]])
+        self.rows += 1
+        if (self.rows >= self.maxRows):
+            self.flush()
+
+    def due(self):
+        """
+        Seconds until the time based flush, None if the batch is empty
+        """
+        if (self.rows == 0 and len(self.held) == 0):
+            return None
+        return max(0, self.firstTime + self.maxDelay - time.time())
+
+    def flush(self, atomic=False):
+        """
+        Write all queued rows in one transaction
+        atomic - all or nothing: a failed batch is rolled back and kept for
+                 another try (or spooled), never written row by row
+        """
+        # all-or-nothing batches that failed before go first
+        held = self.held
+        self.held = []
+        for groups, rows, attempts in held:
+            self.write(groups, rows, True, attempts)
+        if (self.rows == 0):
+            return
+        if (self.cursor == None and self.spool == None):
+            # nothing to write to, try again after maxDelay
+            self.firstTime = time.time()
+            return
+        groups = self.groups
+        rows = self.rows
+        self.groups = []
+        self.rows = 0
+        self.write(groups, rows, atomic)
+
+    def write(self, groups, rows, atomic=False, attempts=0):
+        """
+        Write groups taken from the batch, or spool or keep them
+        attempts - earlier failed tries of an atomic batch
+        """
+        if (self.spool != None and (self.cursor == None or self.spool.pending() > 0)):
+            # stay behind the batches already spooled
+            self.spoolGroups(groups, rows, atomic)
+            return
+        if (self.cursor == None):
+            self.keep(groups, rows, atomic, attempts)
+            return
+        try:
+            self.writeGroups(groups)
+        except Exception, e:
+            e = self.retry(groups, e)
+            if (e == None):
+                self.flushes += 1
+                return
+            if (self.spool != None and isDatabaseDown(e)):
+                self.log(WARN, "Database unreachable, spooling batch  %s", e)
+                self.spoolGroups(groups, rows, atomic)
+                return
+            if (self.cursor == None):
+                # the connection was lost and not replaced
+                self.log(WARN, "No database connection, keeping batch  %s", e)
+                self.keep(groups, rows, atomic, attempts)
+                return
+            try:
+                self.cursor.execute(ROLLBACK)
+            except:
+                pass
+            if (atomic):
+                attempts += 1
+                if (attempts < self.atomicAttempts):
+                    self.log(ERROR, "Error writing batch to db  %s  keeping it for another try", e)
+                    self.keep(groups, rows, True, attempts)
+                    return
+                self.log(ERROR, "Error writing batch to db  %s  giving up after %d tries", e, attempts)
+                self.dropRows(groups)
+            else:
+                self.log(ERROR, "Error writing batch to db  %s  retrying row by row", sys.exc_info()[0])
+                self.flushRows(groups)
+        self.flushes += 1
+
+    def retry(self, groups, err):
+        """
+        Write the groups again if the connection was lost and could be replaced
+        Returns None once written, otherwise the last error
+        """
+        if (self.reconnect == None):
+            return err
+        try:
+            if (self.reconnect(err) == None):
+                return err
+            # the connection was lost, nothing was committed; try again once
+            self.writeGroups(groups)
+            return None
+        except Exception, e:
+            return e
+
+    def keep(self, groups, rows, atomic=False, attempts=0):
+        """
+        Put groups that were not written back for the next flush, in front
+        of the batch or, all-or-nothing ones, on their own
+        """
+        if (atomic):
+            self.held.append((groups, rows, attempts))
+        else:
+            self.groups[0:0] = groups
+            self.rows += rows
+        self.firstTime = time.time()
+
+    def spoolGroups(self, groups, rows, atomic=False):
+        """
+        Keep the groups in the spool until the database is back
+        """
+        self.spool.append(groups, atomic)
+        self.spooled += rows
+
+    def writeGroups(self, groups):
+        """
+        Write groups of rows in one transaction
+        """
+        t0 = time.time()
+        self.cursor.execute(START_TRANSACTION)
+        for sql, rows in groups:
+            self.cursor.executemany(sql, rows)
+        self.cursor.execute(COMMIT)
+        count = sum([len(rows) for sql, rows in groups])
+        self.written += count
+        if (self.timing != None):
+            self.timing(time.time() - t0, count)
+
+    def flushRows(self, groups):
+        """
+        Write row by row so one bad row does not lose the whole batch
+        """
+        for sql, rows in groups:
+            for row in rows:
+                try:
+                    self.cursor.execute(sql, row)
+                    self.written += 1
+                except:
+                    self.errors += 1
+                    self.log(ERROR, "Error writing row to db  %s\n%s", sys.exc_info()[0], formatRow(row))
+                    if (self.failed != None):
+                        self.failed(sql, row)
+        self.cursor.execute(COMMIT)
+
+    def dropRows(self, groups):
+        """
+        Give up the rows of an all-or-nothing batch that kept failing
+        """
+        for sql, rows in groups:
+            for row in rows:
+                self.errors += 1
+                self.log(ERROR, "%s", formatRow(row))
+                if (self.failed != None):
+                    self.failed(sql, row)
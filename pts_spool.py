@@ -0,0 +1,381 @@
+# pts_spool.py
+# Pneumatic Tube System write-ahead spool
+# Keeps database batches on disk while MySQL is unreachable
+# By MS Technology Solutions LLC
+# For Colombo Pneumatic Tube Systems Inc
+#
+# A batch that cannot be written because the database is down is appended
+# to the spool instead of being dropped, and so is every later batch until
+# the spool is empty again, so statements reach the database in the order
+# the packets arrived.  The spool is a series of segment files
+# (pts_spool_NNNNNNNN.seg), each a sequence of records:
+#   magic 'SP', payload length, CRC-32 of the payload, pickled [sql, rows] groups
+# (a dictionary {'atomic': True, 'groups': groups} for an all-or-nothing batch)
+# A small checkpoint file (pts_spool.pos) holds the segment and offset of
+# the oldest record not yet written.  SpoolDrainer retries the database
+# every few seconds and writes the records back oldest first, one
+# transaction each; drained segments are deleted.
+#
+# After a crash new records always go to a fresh segment, a torn record at
+# the end of an old segment is ignored and a damaged one is skipped.  A
+# record written to the database just before a crash, but before its
+# checkpoint, is written a second time.
+#
+# History:
+# v1.00     17-Oct-2026  Initial Release
+# v1.01     17-Oct-2026  Statements from pts_sql
+# v1.02     17-Oct-2026  All-or-nothing batches are retried whole, never row by row
+# v1.03     17-Oct-2026  Messages through a log function
+#
+import cPickle
+import glob
+import os
+import re
+import struct
+import sys
+import threading
+import zlib
+from pts_console import printLog, INFO, WARN, ERROR
+from pts_dbpool import isDatabaseDown
+from pts_sink import EventBatch
+from pts_sql import ROLLBACK
+
+# magic, payload length, CRC-32 of the payload
+RECORD = struct.Struct('<2sLL')
+RECORD_MAGIC = 'SP'
+# segment number and offset of the next record to drain
+CHECKPOINT = struct.Struct('<LQ')
+
+def readRecord( f, offset, log=printLog ):
+    """
+    Read the record at offset of an open segment, skipping damaged bytes
+    Returns (payload, next offset), or (None, offset) at the end of the data
+    """
+    while 1:
+        f.seek(offset)
+        header = f.read(RECORD.size)
+        if (len(header) < RECORD.size):
+            return None, offset
+        magic, length, crc = RECORD.unpack(header)
+        if (magic == RECORD_MAGIC):
+            payload = f.read(length)
+            if (len(payload) < length):
+                # torn write at the end of the segment
+                return None, offset
+            if ((zlib.crc32(payload) & 0xffffffff) == crc):
+                return payload, offset + RECORD.size + length
+        # damaged, look for the next record
+        f.seek(offset + 1)
+        rest = f.read()
+        nxt = rest.find(RECORD_MAGIC)
+        log(ERROR, "Spool damaged at %d skipping %s", offset, (nxt + 1) if nxt >= 0 else "rest")
+        if (nxt < 0):
+            return None, offset + 1 + len(rest)
+        offset = offset + 1 + nxt
+
+class Spool(object):
+    """
+    Segmented append-only queue of statement batches on disk
+      directory    - where the segment files go
+      name         - file name prefix
+      segmentBytes - size after which a new segment is started
+      sync         - fsync every record, otherwise only when a segment is closed
+      log          - function(level, fmt, *args), None to print
+    """
+    def __init__(self, directory, name='pts_spool', segmentBytes=16*1024*1024, sync=True, log=None):
+        self.directory = directory
+        self.log = log or printLog
+        self.name = name
+        self.segmentBytes = segmentBytes
+        self.sync = sync
+        self.lock = threading.Lock()
+        # segment numbers on disk, oldest first, and the next one to create
+        self.segments = []
+        self.nextSeq = 1
+        # segment being appended to
+        self.writer = None
+        self.writeSize = 0
+        # segment and offset being drained, offset after the peeked record
+        self.reader = None
+        self.readSeq = None
+        self.readOffset = 0
+        self.nextOffset = None
+        self.checkpoint = None
+        # records not yet drained
+        self.records = 0
+        # statistics
+        self.appended = 0
+        self.drained = 0
+        self.recover()
+
+    def segmentName(self, seq):
+        return os.path.join(self.directory, '%s_%08d.seg' % (self.name, seq))
+
+    def recover(self):
+        """
+        Pick up the segments and checkpoint left by an earlier run
+        """
+        pattern = re.compile(re.escape(self.name) + r'_(\d{8})\.seg$')
+        for filename in glob.glob(os.path.join(self.directory, self.name + '_*.seg')):
+            m = pattern.search(filename)
+            if (m != None):
+                self.segments.append(int(m.group(1)))
+        self.segments.sort()
+        seq, offset = None, 0
+        posFile = os.path.join(self.directory, self.name + '.pos')
+        if (os.path.exists(posFile)):
+            self.checkpoint = open(posFile, 'r+b')
+            data = self.checkpoint.read(CHECKPOINT.size)
+            if (len(data) == CHECKPOINT.size):
+                seq, offset = CHECKPOINT.unpack(data)
+        else:
+            self.checkpoint = open(posFile, 'wb')
+        if (seq != None):
+            self.nextSeq = max(seq, 1)
+        # segments before the checkpoint were drained already
+        while (len(self.segments) > 0 and seq != None and self.segments[0] < seq):
+            os.remove(self.segmentName(self.segments.pop(0)))
+        if (len(self.segments) == 0):
+            return
+        self.nextSeq = max(self.nextSeq, self.segments[-1] + 1)
+        if (self.segments[0] != seq):
+            offset = 0
+        self.readSeq = self.segments[0]
+        self.readOffset = offset
+        for s in self.segments:
+            f = open(self.segmentName(s), 'rb')
+            pos = offset if s == self.readSeq else 0
+            while 1:
+                payload, pos = readRecord(f, pos, self.log)
+                if (payload == None):
+                    break
+                self.records += 1
+            f.close()
+        if (self.records == 0):
+            self.reset()
+            return
+        self.log(INFO, "Spool holds %d batches in %d segments", self.records, len(self.segments))
+
+    def pending(self):
+        """
+        Batches waiting to be written to the database
+        """
+        return self.records
+
+    def append(self, groups, atomic=False):
+        """
+        Add one batch of [sql, rows] groups
+        atomic - the batch must be written all or nothing
+        """
+        if (atomic):
+            groups = {'atomic': True, 'groups': groups}
+        payload = cPickle.dumps(groups, cPickle.HIGHEST_PROTOCOL)
+        self.lock.acquire()
+        try:
+            if (self.writer == None or self.writeSize >= self.segmentBytes):
+                self.roll()
+            self.writer.write(RECORD.pack(RECORD_MAGIC, len(payload), zlib.crc32(payload) & 0xffffffff))
+            self.writer.write(payload)
+            self.writer.flush()
+            if (self.sync):
+                os.fsync(self.writer.fileno())
+            self.writeSize += RECORD.size + len(payload)
+            self.records += 1
+            self.appended += 1
+        finally:
+            self.lock.release()
+
+    def roll(self):
+        """
+        Close the current segment and start a new one, lock must be held
+        """
+        self.closeWriter()
+        seq = self.nextSeq
+        self.nextSeq += 1
+        self.writer = open(self.segmentName(seq), 'wb')
+        self.writeSize = 0
+        self.segments.append(seq)
+        if (self.readSeq == None):
+            self.readSeq = seq
+            self.readOffset = 0
+
+    def closeWriter(self):
+        if (self.writer != None):
+            self.writer.flush()
+            os.fsync(self.writer.fileno())
+            self.writer.close()
+            self.writer = None
+
+    def peek(self):
+        """
+        Return the oldest batch without removing it as (groups, atomic),
+        (None, False) if the spool is empty
+        """
+        self.lock.acquire()
+        try:
+            while (self.records > 0):
+                if (self.reader == None):
+                    self.reader = open(self.segmentName(self.readSeq), 'rb')
+                payload, offset = readRecord(self.reader, self.readOffset, self.log)
+                if (payload != None):
+                    self.nextOffset = offset
+                    groups = cPickle.loads(payload)
+                    if (isinstance(groups, dict)):
+                        return groups['groups'], groups.get('atomic', False)
+                    return groups, False
+                if (self.readSeq == self.segments[-1]):
+                    # nothing readable left, the count was off
+                    self.log(ERROR, "Spool lost %d batches", self.records)
+                    self.records = 0
+                    break
+                # end of this segment, go on with the next one
+                self.reader.close()
+                self.reader = None
+                os.remove(self.segmentName(self.segments.pop(0)))
+                self.readSeq = self.segments[0]
+                self.readOffset = 0
+            return None, False
+        finally:
+            self.lock.release()
+
+    def commit(self):
+        """
+        Remove the batch returned by peek() once it is in the database
+        """
+        self.lock.acquire()
+        try:
+            self.readOffset = self.nextOffset
+            self.records -= 1
+            self.drained += 1
+            if (self.records == 0):
+                # drained, start over with no segments
+                self.reset()
+            self.saveCheckpoint()
+        finally:
+            self.lock.release()
+
+    def reset(self):
+        """
+        Delete every segment of an empty spool, lock must be held
+        """
+        self.closeWriter()
+        if (self.reader != None):
+            self.reader.close()
+            self.reader = None
+        for seq in self.segments:
+            os.remove(self.segmentName(seq))
+        self.segments = []
+        # numbering continues, an old checkpoint never matches a new segment
+        self.readSeq = self.nextSeq
+        self.readOffset = 0
+
+    def saveCheckpoint(self):
+        """
+        Overwrite the checkpoint in place, lock must be held
+        """
+        self.checkpoint.seek(0)
+        self.checkpoint.write(CHECKPOINT.pack(self.readSeq or 0, self.readOffset))
+        self.checkpoint.flush()
+        if (self.sync):
+            os.fsync(self.checkpoint.fileno())
+
+    def close(self):
+        self.lock.acquire()
+        try:
+            self.closeWriter()
+            if (self.reader != None):
+                self.reader.close()
+                self.reader = None
+            self.checkpoint.close()
+        finally:
+            self.lock.release()
+
+    def stats(self):
+        """
+        Spool metrics as a dictionary
+        """
+        return {'pending': self.records, 'appended': self.appended, 'drained': self.drained,
+                'segments': len(self.segments)}
+
+class SpoolDrainer(threading.Thread):
+    """
+    Thread writing spooled batches back to the database, oldest first
+      spool    - the Spool to drain
+      pool     - ConnectionPool to borrow a connection from
+      interval - seconds between attempts while the database is down
+      log      - function(level, fmt, *args), None to print
+    """
+    def __init__(self, spool, pool, interval=5, log=None):
+        threading.Thread.__init__(self, name='spool drainer')
+        self.daemon = True
+        self.spool = spool
+        self.pool = pool
+        self.interval = interval
+        self.log = log or printLog
+        # failed tries of the oldest batch when it is all-or-nothing
+        self.failures = 0
+        self.stopped = threading.Event()
+
+    def run(self):
+        while (not self.stopped.isSet()):
+            if (self.spool.pending() > 0):
+                try:
+                    self.drain()
+                except:
+                    self.log(ERROR, "Error draining spool  %s %s", sys.exc_info()[0], sys.exc_info()[1])
+            self.stopped.wait(self.interval)
+
+    def drain(self):
+        """
+        Write spooled batches until the spool is empty or the database fails
+        """
+        try:
+            conn = self.pool.borrow()
+        except Exception, e:
+            if (not isDatabaseDown(e)):
+                raise
+            return
+        batch = EventBatch()
+        batch.cursor = conn.cursor()
+        batch.log = self.log
+        count = 0
+        try:
+            while (not self.stopped.isSet()):
+                groups, atomic = self.spool.peek()
+                if (groups == None):
+                    break
+                try:
+                    batch.writeGroups(groups)
+                except Exception, e:
+                    try:
+                        batch.cursor.execute(ROLLBACK)
+                    except:
+                        pass
+                    if (isDatabaseDown(e)):
+                        self.log(WARN, "Database lost while draining spool  %s", e)
+                        self.pool.closeConnection(conn)
+                        conn = None
+                        return
+                    if (atomic):
+                        self.failures += 1
+                        if (self.failures < batch.atomicAttempts):
+                            # leave it at the head of the spool for the next interval
+                            self.log(ERROR, "Error writing spooled batch to db  %s  keeping it for another try", e)
+                            return
+                        self.log(ERROR, "Error writing spooled batch to db  %s  giving up after %d tries", e, self.failures)
+                        batch.dropRows(groups)
+                    else:
+                        self.log(ERROR, "Error writing spooled batch to db  %s  retrying row by row", sys.exc_info()[0])
+                        batch.flushRows(groups)
+                self.spool.commit()
+                self.failures = 0
+                count += 1
+        finally:
+            if (conn != None):
+                batch.cursor.close()
+                self.pool.release(conn)
+            if (count > 0):
+                self.log(INFO, "Spool wrote %d batches, %d left", count, self.spool.pending())
+
+    def stop(self):
+        self.stopped.set()
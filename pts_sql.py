@@ -0,0 +1,120 @@
+# pts_sql.py
+# Pneumatic Tube System SQL statement catalog
+# By MS Technology Solutions LLC
+# For Colombo Pneumatic Tube Systems Inc
+#
+# Every statement the listener and its tools send to pts_datalog is defined
+# here once.  Values are never formatted into the text: they are passed as
+# parameters and bound by the driver, so a station name with a quote in it
+# is just data and the text of a statement is the same for every row.
+# EventBatch groups consecutive rows by statement text and MySQLdb turns
+# executemany of an INSERT ... VALUES into one multi-row INSERT, so rows
+# that share a constant text are written in one round trip.
+#
+# MySQLdb has no server side prepared statements; the constant text is what
+# would be prepared once per connection with a driver that does.
+#
+# Statements with a variable number of markers (IN lists, CASE arms) are
+# built by the functions below and cached per count, so they are also
+# constant for a given number of values.
+#
+# History:
+# v1.00     17-Oct-2026  Initial Release
+# v1.01     17-Oct-2026  Source and ReceiverID in SELECT_EVENT_KEYS
+# v1.02     17-Oct-2026  deleteParameters replaces updateLastCont and deleteTransGaps
+# v1.03     17-Oct-2026  Add SELECT_MAX_TRANS_RANGE for bench_listener.py
+# v1.04     17-Oct-2026  LastContTrans rows updated in place again (updateLastContRows), deleteParameters removed
+#
+
+# transaction control
+START_TRANSACTION = "START TRANSACTION"
+COMMIT = "COMMIT"
+ROLLBACK = "ROLLBACK"
+
+# eventlog
+INSERT_TRANSACTION = ("INSERT INTO eventlog (TransNum, System, EventType, EventStart, "
+                      "Duration, Source, Destination, Status, Flags, MainStationName, SubStationName) "
+                      "VALUES (%s, %s, %s, %s, %s, %s, %s, %s, %s, %s, %s)")
+UPDATE_TRANSACTION = ("UPDATE eventlog SET EventStart = %s, Duration = %s, Source = %s, Destination = %s, "
+                      "Flags = %s, MainStationName = %s, SubStationName = %s "
+                      "WHERE System = %s AND TransNum = %s AND EventType = %s")
+UPDATE_SECURE_REM = ("UPDATE eventlog SET ReceiverID = %s, ReceiveTime = %s "
+                     "WHERE System = %s AND TransNum = %s AND Status = 0")
+# secure removals and card scans, ID stored into Flags
+INSERT_CARD_EVENT = ("INSERT INTO eventlog (TransNum, System, EventType, EventStart, "
+                     "Source, Status, Flags, ReceiverID, SubStationName) "
+                     "VALUES (%s, %s, %s, %s, %s, %s, %s, %s, %s)")
+# Mainstream v500 card scans, site number stored into Flags
+INSERT_CARD_SCAN_V15 = ("INSERT INTO eventlog (TransNum, System, EventType, EventStart, "
+                        "Duration, Source, Destination, Status, Flags, ReceiverID, ReceiveTime) "
+                        "VALUES (0, %s, %s, %s, %s, %s, %s, %s, %s, %s, %s)")
+SELECT_HIGH_TRANS = "SELECT System, MAX(TransNum) FROM eventlog WHERE TransNum > 0 GROUP BY System"
+SELECT_RECENT_TRANS = "SELECT TransNum, EventType FROM eventlog WHERE System = %s AND TransNum > %s"
+SELECT_MAX_TRANS_RANGE = "SELECT MAX(TransNum) FROM eventlog WHERE System BETWEEN %s AND %s"
+SELECT_TRANS_KEYS = ("SELECT System, TransNum, EventType FROM eventlog "
+                     "WHERE System = %s AND TransNum BETWEEN %s AND %s")
+SELECT_EVENT_KEYS = ("SELECT System, TransNum, EventType, EventStart, Source, ReceiverID FROM eventlog "
+                     "WHERE System = %s AND TransNum = 0 AND EventStart BETWEEN %s AND %s")
+
+# station
+DELETE_STATIONS = "DELETE FROM station WHERE system = %s"
+INSERT_STATION = "INSERT INTO station (system, station, station_name) VALUES (%s, %s, %s)"
+SELECT_STATIONS = "SELECT system, station, station_name FROM station"
+SELECT_STATION_NAME = "SELECT station_name FROM station WHERE system = %s AND station = %s"
+
+# parameters
+SELECT_LAST_CONT = "SELECT ParVal1, ParVal2 FROM parameters WHERE ParName = 'LastContTrans'"
+SELECT_LAST_CONT_FINGERPRINT = ("SELECT COUNT(*), SUM(ParVal2), SUM(ParVal1 * ParVal2) FROM parameters "
+                                "WHERE ParName = 'LastContTrans'")
+SELECT_TRANS_GAPS = ("SELECT ParName, ParVal1, ParVal2 FROM parameters "
+                     "WHERE ParName = 'TransHigh' OR ParName LIKE 'TransGap%'")
+INSERT_PARAMETER = "INSERT INTO parameters (ParName, ParVal1, ParVal2) VALUES (%s, %s, %s)"
+
+# heartbeat
+CREATE_HEARTBEAT = """CREATE TABLE IF NOT EXISTS heartbeat (
+    System TINYINT UNSIGNED NOT NULL,
+    Station TINYINT UNSIGNED NOT NULL,
+    LastSeen DATETIME NOT NULL,
+    MsTimer INT UNSIGNED NOT NULL,
+    SecTimer INT UNSIGNED NOT NULL,
+    Status CHAR(35) NOT NULL,
+    PRIMARY KEY (System, Station))"""
+REPLACE_HEARTBEAT = ("REPLACE INTO heartbeat (System, Station, LastSeen, MsTimer, SecTimer, Status) "
+                     "VALUES (%s, %s, %s, %s, %s, %s)")
+
+# (name, count) -> statement text
+_built = {}
+
+def markers(count):
+    """
+    Comma separated list of count parameter markers
+    """
+    return ", ".join(["%s"] * count)
+
+def updateLastContRows(count):
+    """
+    UPDATE of the LastContTrans rows of count systems in one statement, each
+    only while it still holds the value saved last, so a row changed by an
+    external resync in the meantime is left alone (fewer rows affected)
+    Params: (system, watermark) pairs, the count systems, then
+    (system, saved value) pairs
+    """
+    sql = _built.get(('updateLastContRows', count))
+    if (sql == None):
+        sql = _built[('updateLastContRows', count)] = (
+            "UPDATE parameters SET ParVal2 = CASE ParVal1" + " WHEN %s THEN %s" * count + " END "
+            "WHERE ParName = 'LastContTrans' AND ParVal1 IN (" + markers(count) + ") "
+            "AND ParVal2 = CASE ParVal1" + " WHEN %s THEN %s" * count + " END")
+    return sql
+
+def deleteTransGaps(count):
+    """
+    DELETE of the TransGap<system> and TransHigh rows of count systems
+    Params: the count 'TransGap<system>' names, then the count systems
+    """
+    sql = _built.get(('deleteTransGaps', count))
+    if (sql == None):
+        sql = _built[('deleteTransGaps', count)] = (
+            "DELETE FROM parameters WHERE ParName IN (" + markers(count) + ") "
+            "OR (ParName = 'TransHigh' AND ParVal1 IN (" + markers(count) + "))")
+    return sql
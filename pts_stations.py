@@ -0,0 +1,89 @@
+# pts_stations.py
+# Pneumatic Tube System station name cache
+# By MS Technology Solutions LLC
+# For Colombo Pneumatic Tube Systems Inc
+#
+# The station table only changes when an 'S' parameter block arrives, so
+# the names are loaded once at startup and then replaced per system from
+# each parsed parameter block.  Lookups never touch the database, except
+# for a system/station that was in neither, which is read once and then
+# remembered (also when it does not exist, but not when the lookup failed).
+#
+# History:
+# v1.00     17-Oct-2026  Initial Release
+# v1.01     17-Oct-2026  No lookup without a connection (database down)
+# v1.02     17-Oct-2026  Statements from pts_sql
+# v1.03     17-Oct-2026  Errors reported through a log function
+# v1.04     17-Oct-2026  A failed lookup is not cached
+#
+import sys
+from pts_console import printLog, ERROR
+from pts_sql import SELECT_STATIONS, SELECT_STATION_NAME
+
+class StationNames(object):
+    """
+    Per system dictionary of station names
+      log - function(level, fmt, *args), None to print
+    """
+    def __init__(self, log=None):
+        self.log = log or printLog
+        # system -> {station: name}
+        self.systems = {}
+        # statistics
+        self.hits = 0
+        self.misses = 0
+
+    def load(self, dbcursor):
+        """
+        Read the whole station table
+        """
+        try:
+            dbcursor.execute(SELECT_STATIONS)
+            systems = {}
+            for system, station, name in dbcursor.fetchall():
+                systems.setdefault(system, {})[station] = name
+            self.systems = systems
+
+        except:
+            self.log(ERROR, "Error loading station names  %s", sys.exc_info()[0])
+
+        return
+
+    def update(self, pb):
+        """
+        Replace the names of one system from a parsed parameter block
+        pb[0] = system number; pb[6..15] = station name 0..9
+        """
+        names = {}
+        for i in range(10):
+            names[i] = pb[6+i]
+        # single assignment, readers see either the old or the new set
+        self.systems[pb[0]] = names
+
+    def get(self, systemNum, stationNum, dbcursor):
+        """
+        Return a station name, "" if unknown
+        dbcursor is None while the database is down, the name is looked up
+        again next time
+        """
+        names = self.systems.get(systemNum)
+        if (names != None and stationNum in names):
+            self.hits += 1
+            return names[stationNum]
+        self.misses += 1
+        name = ""
+        if (dbcursor == None):
+            return name
+        try:
+            dbcursor.execute(SELECT_STATION_NAME, (systemNum, stationNum))
+            row = dbcursor.fetchone()
+            if (row != None):
+                name = row[0]
+
+        except:
+            # not remembered, looked up again next time
+            self.log(ERROR, "Error getting station names  %s", sys.exc_info()[0])
+            return name
+
+        self.systems.setdefault(systemNum, {})[stationNum] = name
+        return name
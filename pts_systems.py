@@ -0,0 +1,126 @@
+# pts_systems.py
+# Pneumatic Tube System per system state
+# By MS Technology Solutions LLC
+# For Colombo Pneumatic Tube Systems Inc
+#
+# lastCont and lastTouched used to be lists of 21 entries, so a packet from
+# system 21 or higher raised an IndexError.  SystemTable holds an entry per
+# system number that has been seen or has a LastContTrans row, created on
+# first use, for any system number 0-255.
+#
+# History:
+# v1.00     17-Oct-2026  Initial Release
+# v1.01     17-Oct-2026  Add fingerprint to detect external LastContTrans changes
+# v1.02     17-Oct-2026  takeDirty limited to the systems of one writer, fingerprint of the saved values
+# v1.03     17-Oct-2026  takeDirty returns the saved value, load can prefer the database value
+#
+import time
+
+class SystemState(object):
+    """
+    Auto-resync state of one system
+      watermark - last continuous transaction number (lastCont)
+      dirty     - watermark not yet written to the database (lastTouched)
+      stored    - the system has a LastContTrans row
+      saved     - watermark of that row as last written or read
+      lastSeen  - time of the last packet written for it, None if none yet
+    """
+    def __init__(self, watermark=0, stored=False):
+        self.watermark = watermark
+        self.dirty = False
+        self.stored = stored
+        self.saved = watermark
+        self.lastSeen = None
+
+class SystemTable(object):
+    """
+    Sparse SystemState per system number
+    Watermark changes are serialized by the caller (ListenerState.lock)
+    """
+    def __init__(self):
+        # system -> SystemState
+        self.systems = {}
+
+    def get(self, system):
+        """
+        Return the state of a system, creating it on first use
+        """
+        entry = self.systems.get(system)
+        if (entry == None):
+            entry = self.systems[system] = SystemState()
+        return entry
+
+    def watermark(self, system):
+        entry = self.systems.get(system)
+        if (entry == None):
+            return 0
+        return entry.watermark
+
+    def setWatermark(self, system, watermark):
+        """
+        Move the watermark of a system and mark it for the next save
+        """
+        entry = self.get(system)
+        entry.watermark = watermark
+        entry.dirty = True
+
+    def seen(self, system):
+        """
+        Note a packet of a system
+        """
+        self.get(system).lastSeen = time.time()
+
+    def load(self, rows, prefer=()):
+        """
+        Take (system, watermark) rows read from the database
+        Entries waiting to be saved keep their own value, unless their
+        system is in prefer (changed by someone else while it was saved)
+        """
+        for system, watermark in rows:
+            entry = self.get(int(system))
+            entry.stored = True
+            entry.saved = int(watermark)
+            if (int(system) in prefer):
+                entry.dirty = False
+            if (not entry.dirty):
+                entry.watermark = int(watermark)
+
+    def takeDirty(self, owns=None):
+        """
+        Return (system, watermark, stored, saved) of every unsaved entry and
+        mark them saved; see restoreDirty when the save fails
+          owns - function(system) returning True for the entries to take, None for all
+        """
+        dirty = []
+        for system, entry in sorted(self.systems.items()):
+            if (entry.dirty and (owns == None or owns(system))):
+                dirty.append((system, entry.watermark, entry.stored, entry.saved))
+                entry.dirty = False
+        return dirty
+
+    def restoreDirty(self, dirty):
+        """
+        Mark entries from takeDirty unsaved again
+        """
+        for system, watermark, stored, saved in dirty:
+            self.systems[system].dirty = True
+
+    def fingerprint(self):
+        """
+        (rows, sum of watermarks, sum of system * watermark) of the stored
+        systems, as computed by the database for the LastContTrans rows
+        Unsaved watermarks (another writer's) count with their saved value
+        """
+        count = total = weighted = 0
+        for system, entry in self.systems.items():
+            if (entry.stored):
+                count += 1
+                total += entry.saved
+                weighted += system * entry.saved
+        return (count, total, weighted)
+
+    def items(self):
+        """
+        (system, SystemState) pairs in system order
+        """
+        return sorted(self.systems.items())
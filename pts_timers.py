@@ -0,0 +1,63 @@
+# pts_timers.py
+# Pneumatic Tube System timer scheduling
+# By MS Technology Solutions LLC
+# For Colombo Pneumatic Tube Systems Inc
+#
+# The listener waits in select() with the time to the next timer as the
+# timeout, so periodic work runs on schedule whether packets arrive or not.
+#
+# History:
+# v1.00     17-Oct-2026  Initial Release
+#
+import heapq
+import sys
+import time
+
+class Timers(object):
+    """
+    Heap of one-shot and repeating timers
+    """
+    def __init__(self):
+        # (deadline, sequence, function, interval)
+        self.heap = []
+        self.seq = 0
+
+    def callLater(self, delay, fn, interval=None):
+        """
+        Run fn after delay seconds, then every interval seconds if given
+        """
+        self.seq += 1
+        heapq.heappush(self.heap, (time.time() + delay, self.seq, fn, interval))
+
+    def callEvery(self, interval, fn):
+        """
+        Run fn every interval seconds
+        """
+        self.callLater(interval, fn, interval)
+
+    def timeout(self):
+        """
+        Seconds until the next timer, None if there is none
+        """
+        if (len(self.heap) == 0):
+            return None
+        return max(0, self.heap[0][0] - time.time())
+
+    def runDue(self):
+        """
+        Run every timer whose deadline has passed
+        """
+        now = time.time()
+        while (len(self.heap) > 0 and self.heap[0][0] <= now):
+            deadline, seq, fn, interval = heapq.heappop(self.heap)
+            if (interval != None):
+                # keep the rhythm, but never queue up missed runs
+                deadline += interval
+                if (deadline <= now):
+                    deadline = now + interval
+                self.seq += 1
+                heapq.heappush(self.heap, (deadline, self.seq, fn, interval))
+            try:
+                fn()
+            except:
+                print "\nError in timer ", sys.exc_info()[0], sys.exc_info()[1]
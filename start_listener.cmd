@@ -1 +1 @@
-\python27\python pts_listener_v1.48.py
+\python27\python pts_listener_v1.49.py
@@ -0,0 +1 @@
+\python27\python pts_replay.py